@@ -8,6 +8,7 @@ import requests
 from datetime import datetime, timedelta
 from dateutil.relativedelta import *
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Value, Sum, Q, Avg, F
 from django.db.models.functions import Lower
 from django.urls import reverse
@@ -154,6 +155,17 @@ def calculateAverageNps(totalNpsCount, promoterCount, detractorCount):
 		return None
 	
 
+def calculateSampleStdDev(total, squareTotal, count):
+	"""
+	Sample std deviation (like STDEV.S) from the count, sum and sum of squares of the values,
+	  so it can be calculated from pre-summed data.
+	Return: {float} Std deviation, or None if less than 2 values.
+	"""
+	if not count or count < 2:
+		return None
+	return (max(squareTotal - total * total / count, 0) / (count - 1)) ** 0.5
+	
+
 def getVoteResponsesNpsCounts(responses):
 	"""
 	Return: {obj} NPS user category counts (detractor/passive/promoter) across given responses.
@@ -173,304 +185,211 @@ def getVoteResponsesNpsCounts(responses):
 	return data
 
 
-def getHistoricalNpsChartData(allProjectSnapshots):
+def getHistoricalChartsData(allProjectSnapshots):
 	"""
-	NPS history line chart on project detail page.
-	Takes snapshots and returns quarter dates with NPS and targets for historical line chart.
-	Return: {obj} Chart data with xaxis quarters, scores, and targets.
+	NPS, UMUX and goal completion history line charts on project detail page, built in one pass.
+	Loads the quarterly snapshots (2 years or less ago) and the project's year settings once (2 queries),
+	  indexes them by (year, quarter)/year, then each chart loops thru quarters starting at its first
+	  meaningful quarter. If a quarter has no (meaningful) snapshot, it gets an empty x-axis tick.
+	Return: {obj} 'nps', 'umux' and 'goal' chart data with xaxis quarters, scores, and targets (NPS/UMUX).
 	"""
 	endDate = getLastDateOfQuarter(timezone.now() - timedelta(days=95))
 	startDate = getFirstDateOfQuarter(endDate - timedelta(days=365*2))
-	allProjectSnapshots = allProjectSnapshots.filter(date_period='quarter', nps_meaningful_data=True, date__gte=startDate).order_by('date')
+	snapshots = list(allProjectSnapshots.filter(date_period='quarter', date__gte=startDate).select_related('project').order_by('date'))
 	
-	# If there are snapshots, set some vars and continue
-	# Else return empty obj.
-	if allProjectSnapshots.exists():
-		project = allProjectSnapshots.first().project
-		startDate = getFirstDateOfQuarter(allProjectSnapshots.first().date)
-	else:
-		return {}
+	if not snapshots:
+		return {
+			'nps': {},
+			'umux': {},
+			'goal': {},
+		}
 	
-	data = {
-		'xaxis': ['x'],
-		'actual': ['Actual'],
-		'scoreDates': [],
-		'target': ['Target'],
-		'targetExceed': ['Exceed'],
-		'targetYears': [],
-	}
+	yearSettings = {}
+	for yearSetting in snapshots[0].project.project_year_setting_project.order_by('-created_at'):
+		yearSettings.setdefault(yearSetting.year, yearSetting)
 	
-	# For each quarter in date range, get the field value or set to empty.
-	pidx = pd.period_range(start = startDate, end = endDate, freq ='Q')
-	for quarterPeriod in pidx:
-		data['xaxis'].append(f'{quarterPeriod.quarter}Q{str(quarterPeriod.year)[-2:]}')
+	def getChartData(meaningfulField, scoreField, scoreDateField, targetField=None):
+		chartSnapshots = [snapshot for snapshot in snapshots if not meaningfulField or getattr(snapshot, meaningfulField)]
+		if not chartSnapshots:
+			return {}
 		
-		# If no snapshot for the quarter, set as empty plot via 'except'.
-		try:
-			snapshot = allProjectSnapshots.get(date__year=quarterPeriod.year, date_quarter=quarterPeriod.quarter)
-			data['actual'].append(round(snapshot.nps_score, 1))
-			data['targetYears'].append(quarterPeriod.year)
-			
-			try:
-				data['scoreDates'].append(snapshot.nps_score_date.strftime('%b %d'))
-			except:
-				data['scoreDates'].append('')
-			
-			try:
-				yearTarget = project.project_year_setting_project.filter(year=quarterPeriod.year).values('nps_target').first()['nps_target']
-				data['target'].append(round(yearTarget, 1))
-			except Exception as ex:
-				data['target'].append('null')
+		# Only one snapshot per quarter is valid.
+		snapshotsByQuarter = {}
+		for snapshot in chartSnapshots:
+			snapshotsByQuarter.setdefault((snapshot.date.year, snapshot.date_quarter), []).append(snapshot)
+		
+		data = {
+			'xaxis': ['x'],
+			'actual': ['Actual'],
+			'scoreDates': [],
+		}
+		if targetField:
+			data.update({
+				'target': ['Target'],
+				'targetExceed': ['Exceed'],
+				'targetYears': [],
+			})
+		
+		# For each quarter in date range, get the field value or set to empty.
+		pidx = pd.period_range(start = getFirstDateOfQuarter(chartSnapshots[0].date), end = endDate, freq ='Q')
+		for quarterPeriod in pidx:
+			data['xaxis'].append(f'{quarterPeriod.quarter}Q{str(quarterPeriod.year)[-2:]}')
 			
+			# If no snapshot for the quarter, set as empty plot via 'except'.
 			try:
-				yearTargetExceed = project.project_year_setting_project.get(year=quarterPeriod.year).nps_target_exceed
-				data['targetExceed'].append(round(yearTargetExceed, 1))
-			except Exception as ex:
-				data['targetExceed'].append('null')
+				quarterSnapshots = snapshotsByQuarter.get((quarterPeriod.year, quarterPeriod.quarter), [])
+				if len(quarterSnapshots) != 1:
+					raise ValueError('No snapshot for quarter')
+				snapshot = quarterSnapshots[0]
 				
-		except Exception as ex:
-			data['actual'].append('null')
-			data['targetYears'].append('null')
-			data['scoreDates'].append('null')
-			data['target'].append('null')
-			data['targetExceed'].append('null')
+				data['actual'].append(round(getattr(snapshot, scoreField), 1))
+				
+				try:
+					data['scoreDates'].append(getattr(snapshot, scoreDateField).strftime('%b %d'))
+				except:
+					data['scoreDates'].append('')
+				
+				if targetField:
+					data['targetYears'].append(quarterPeriod.year)
+					yearSetting = yearSettings.get(quarterPeriod.year, None)
+					
+					try:
+						data['target'].append(round(getattr(yearSetting, targetField), 1))
+					except Exception as ex:
+						data['target'].append('null')
+					
+					try:
+						data['targetExceed'].append(round(getattr(yearSetting, f'{targetField}_exceed'), 1))
+					except Exception as ex:
+						data['targetExceed'].append('null')
+				
+			except Exception as ex:
+				data['actual'].append('null')
+				data['scoreDates'].append('null')
+				if targetField:
+					data['targetYears'].append('null')
+					data['target'].append('null')
+					data['targetExceed'].append('null')
 		
-	return data
+		return data
+	
+	return {
+		'nps': getChartData('nps_meaningful_data', 'nps_score', 'nps_score_date', 'nps_target'),
+		'umux': getChartData('umux_meaningful_data', 'umux_score', 'umux_score_date', 'umux_target'),
+		'goal': getChartData(None, 'goal_completed_percent', 'goal_completed_date'),
+	}
+
+
+def getHistoricalNpsChartData(allProjectSnapshots):
+	"""
+	NPS history line chart on project detail page.
+	Return: {obj} Chart data with xaxis quarters, scores, and targets.
+	"""
+	return getHistoricalChartsData(allProjectSnapshots)['nps']
 
 
 def getHistoricalUmuxChartData(allProjectSnapshots):
 	"""
 	UMUX history line chart on project detail page.
-	Loop thru quarters starting at first meaningful quarter 2 years or less ago.
-	If a quarter has no (meaningful) snapshot, it gets an empty x-axis tick.
 	Return: {obj} Chart data with xaxis quarters, scores, and targets.
 	"""
-	endDate = getLastDateOfQuarter(timezone.now() - timedelta(days=95))
-	startDate = getFirstDateOfQuarter(endDate - timedelta(days=365*2))
-	allProjectSnapshots = allProjectSnapshots.filter(date_period='quarter', date__gte=startDate, umux_meaningful_data=True).order_by('date')
-	
-	# If there are snapshots, set some vars and continue
-	# Else return empty obj.
-	if allProjectSnapshots.exists():
-		project = allProjectSnapshots.first().project
-		startDate = getFirstDateOfQuarter(allProjectSnapshots.first().date)
-	else:
-		return {}
-	
-	data = {
-		'xaxis': ['x'],
-		'actual': ['Actual'],
-		'scoreDates': [],
-		'target': ['Target'],
-		'targetExceed': ['Exceed'],
-		'targetYears': [],
-	}
-	
-	# For each quarter in date range, get the field value or set to empty.
-	pidx = pd.period_range(start = startDate, end = endDate, freq ='Q')
-	for quarterPeriod in pidx:
-		data['xaxis'].append(f'{quarterPeriod.quarter}Q{str(quarterPeriod.year)[-2:]}')
-		
-		# If no snapshot for the quarter, set as empty plot via 'except'.
-		try:
-			snapshot = allProjectSnapshots.get(date__year=quarterPeriod.year, date_quarter=quarterPeriod.quarter)
-			data['actual'].append(round(snapshot.umux_score, 1))
-			data['targetYears'].append(quarterPeriod.year)
-			
-			try:
-				data['scoreDates'].append(snapshot.umux_score_date.strftime('%b %d'))
-			except:
-				data['scoreDates'].append('')
-			try:
-				yearTarget = project.project_year_setting_project.get(year=quarterPeriod.year).umux_target
-				data['target'].append(round(yearTarget, 1))
-			except Exception as ex:
-				data['target'].append('null')
-			try:
-				yearTargetExceed = project.project_year_setting_project.get(year=quarterPeriod.year).umux_target_exceed
-				data['targetExceed'].append(round(yearTargetExceed, 1))
-			except Exception as ex:
-				data['targetExceed'].append('null')	
-					
-		except Exception as ex:
-			data['actual'].append('null')
-			data['targetYears'].append('null')
-			data['scoreDates'].append('null')
-			data['target'].append('null')
-			data['targetExceed'].append('null')
-		
-	return data
+	return getHistoricalChartsData(allProjectSnapshots)['umux']
 
 
 def getHistoricalGoalCompletionChartData(allProjectSnapshots):
 	"""
-	UMUX history line chart on project detail page.
-	Loop thru quarters starting at first meaningful quarter 2 years or less ago.
-	If a quarter has no (meaningful) snapshot, it gets an empty x-axis tick.
-	Return: {obj} Chart data with xaxis quarters, scores, and targets.
+	Goal completion history line chart on project detail page.
+	Return: {obj} Chart data with xaxis quarters and scores.
 	"""
-	endDate = getLastDateOfQuarter(timezone.now() - timedelta(days=95))
-	startDate = getFirstDateOfQuarter(endDate - timedelta(days=365*2))
-	allProjectSnapshots = allProjectSnapshots.filter(date_period='quarter', date__gte=startDate).order_by('date')
-	
-	# If there are snapshots, set some vars and continue
-	# Else return empty obj.
-	if allProjectSnapshots.exists():
-		project = allProjectSnapshots.first().project
-		startDate = getFirstDateOfQuarter(allProjectSnapshots.first().date)
-	else:
-		return {}
-	
-	data = {
-		'xaxis': ['x'],
-		'actual': ['Actual'],
-		'scoreDates': [],
+	return getHistoricalChartsData(allProjectSnapshots)['goal']
+
+
+HISTOGRAM_CACHE_SECONDS = getattr(settings, 'HISTOGRAM_CACHE_SECONDS', 60*60*24)
+
+
+def getHistogramCounts(responses):
+	"""
+	One query with conditional counts for every NPS (0-10) and UMUX capability/ease of use (1-7) rating.
+	Return: {obj} Counts keyed 'nps0'...'nps10', 'umuxCap1'...'umuxCap7', 'umuxEase1'...'umuxEase7', plus '<name>Total's.
+	"""
+	aggregates = {
+		'npsTotal': Count('id', filter=Q(nps__isnull=False)),
+		'umuxCapTotal': Count('id', filter=Q(umux_capability__isnull=False)),
+		'umuxEaseTotal': Count('id', filter=Q(umux_ease_of_use__isnull=False)),
 	}
+	for i in range(0, 11):
+		aggregates[f'nps{i}'] = Count('id', filter=Q(nps=i))
+	for i in range(1, 8):
+		aggregates[f'umuxCap{i}'] = Count('id', filter=Q(umux_capability=i))
+		aggregates[f'umuxEase{i}'] = Count('id', filter=Q(umux_ease_of_use=i))
 	
-	# For each quarter in date range, get the field value or set to empty.
-	pidx = pd.period_range(start = startDate, end = endDate, freq ='Q')
-	for quarterPeriod in pidx:
-		data['xaxis'].append(f'{quarterPeriod.quarter}Q{str(quarterPeriod.year)[-2:]}')
-		
-		# If no snapshot for the quarter, set as empty plot via 'except'.
-		try:
-			snapshot = allProjectSnapshots.get(date__year=quarterPeriod.year, date_quarter=quarterPeriod.quarter)
-			data['actual'].append(round(snapshot.goal_completed_percent, 1))
-			
-			try:
-				data['scoreDates'].append(snapshot.goal_completed_date.strftime('%b %d'))
-			except:
-				data['scoreDates'].append('')
-				
-		except Exception as ex:
-			data['actual'].append('null')
-			data['scoreDates'].append('null')
-	
-	return data
+	return responses.order_by().aggregate(**aggregates)
 
 
-def getNpsHistogramData(responses):
+def getHistogramPercent(count, total):
+	try:
+		return round((count / total) * 100)
+	except:
+		return 0
+
+
+def getNpsHistogramData(responses, counts=None):
 	"""
 	NPS histogram chart on project detail page.
+	:param counts: Optional getHistogramCounts() results to use instead of querying.
 	Return: {obj} Counts and % of each NPS rating across given responses.
 	"""
 	try:
-		responses = responses.filter(nps__isnull=False)
-		responsesCount = responses.count()
+		if not counts:
+			counts = getHistogramCounts(responses)
 		
-		data = list(responses.values(npsScore=F('nps')).annotate(npsScoreCount=Count('nps')).order_by('nps'))
-		
-		# Set percents for NPS counts, and add missing NPS (set them to 0%)
-		for i in range(0, 11):
-			try:
-				if data[i]['npsScore'] == i:
-					try:
-						data[i]['npsScorePercent'] = round((data[i]['npsScoreCount'] / responsesCount) * 100)
-					except:
-						data[i]['npsScorePercent'] = 0
-				else:
-					pos = i
-					data.insert(pos, {
-							'npsScore': i,
-							'npsScoreCount': 0,
-							'npsScorePercent': 0,
-						}
-					)
-			except:
-				pos = i
-				data.insert(pos, {
-						'npsScore': i,
-						'npsScoreCount': 0,
-						'npsScorePercent': 0,
-					}
-				)
+		data = [{
+			'npsScore': i,
+			'npsScoreCount': counts[f'nps{i}'],
+			'npsScorePercent': getHistogramPercent(counts[f'nps{i}'], counts['npsTotal']),
+		} for i in range(0, 11)]
 	except Exception as ex:
 		data = None
 
-	#print(json.dumps(data, indent=2))
 	return data
 
 
-def getUmuxCapHistogramData(responses):
+def getUmuxCapHistogramData(responses, counts=None):
 	"""
 	UMUX Capabilities histogram chart on project detail page.
-	Return: {obj} Counts and % of each UMUX Capability rating across given responses.
+	:param counts: Optional getHistogramCounts() results to use instead of querying.
+	Return: {obj} Counts and % of each UMUX Capability rating across given responses (7 to 1).
 	"""
 	try:
-		responses = responses.filter(umux_capability__isnull=False)
-		responsesCount = responses.count()
-		
-		data = list(responses.values(umuxCapScore=F('umux_capability')).annotate(umuxCapScoreCount=Count('umux_capability')).order_by('umux_capability'))
-
-		for i in range(0,7):
-			try:
-				if data[i] and data[i]['umuxCapScore'] == i+1:
-					#print(f'{i} exists')
-					try:
-						data[i]['umuxCapScorePercent'] = round((data[i]['umuxCapScoreCount'] / responsesCount) * 100)
-					except:
-						data[i]['umuxCapScorePercent'] = 0
-					#print(f"Rating {i+1}: {data[i]['umuxCapScoreCount']} of {responsesCount}")
-				else:
-					data.insert(i, {
-							'umuxCapScore': i+1,
-							'umuxCapScoreCount': 0,
-							'umuxCapScorePercent': 0,
-						}
-					)
-			except Exception as ex:
-				data.append({
-						'umuxCapScore': i+1,
-						'umuxCapScoreCount': 0,
-						'umuxCapScorePercent': 0,
-					}
-				)
-		data.reverse()
+		if not counts:
+			counts = getHistogramCounts(responses)
 		
+		data = [{
+			'umuxCapScore': i,
+			'umuxCapScoreCount': counts[f'umuxCap{i}'],
+			'umuxCapScorePercent': getHistogramPercent(counts[f'umuxCap{i}'], counts['umuxCapTotal']),
+		} for i in range(7, 0, -1)]
 	except Exception as ex:
 		data = None
 
 	return data
 
 
-def getUmuxEaseHistogramData(responses):
+def getUmuxEaseHistogramData(responses, counts=None):
 	"""
 	UMUX Ease of use histogram chart on project detail page.
-	Return: {obj} Counts and % of each UMUX Ease of Use rating across given responses.
+	:param counts: Optional getHistogramCounts() results to use instead of querying.
+	Return: {obj} Counts and % of each UMUX Ease of Use rating across given responses (7 to 1).
 	"""
 	try:
-		responses = responses.filter(umux_ease_of_use__isnull=False)
-		responsesCount = responses.count()
+		if not counts:
+			counts = getHistogramCounts(responses)
 		
-		data = list(responses.values(umuxEaseScore=F('umux_ease_of_use')).annotate(umuxEaseScoreCount=Count('umux_ease_of_use')).order_by('umux_ease_of_use'))
-		
-		for i in range(0,7):
-			try:
-				if data[i] and data[i]['umuxEaseScore'] == i+1:
-					#print(f'{i+1} exists')
-					try:
-						data[i]['umuxEaseScorePercent'] = round((data[i]['umuxEaseScoreCount'] / responsesCount) * 100)
-					except:
-						data[i]['umuxEaseScorePercent'] = 0
-					#print(f"Rating {i+1}: {data[i]['umuxEaseScoreCount']} of {responsesCount}")
-				else:
-					#print(f'{i+1} missing')
-					data.insert(i, {
-							'umuxEaseScore': i+1,
-							'umuxEaseScoreCount': 0,
-							'umuxEaseScorePercent': 0,
-						}
-					)
-			except Exception as ex:
-				#print(f'{i+1} append it')
-				data.append({
-						'umuxEaseScore': i+1,
-						'umuxEaseScoreCount': 0,
-						'umuxEaseScorePercent': 0,
-					}
-				)
-		data.reverse()
-				
+		data = [{
+			'umuxEaseScore': i,
+			'umuxEaseScoreCount': counts[f'umuxEase{i}'],
+			'umuxEaseScorePercent': getHistogramPercent(counts[f'umuxEase{i}'], counts['umuxEaseTotal']),
+		} for i in range(7, 0, -1)]
 	except Exception as ex:
 		data = None
 	
@@ -480,38 +399,64 @@ def getUmuxEaseHistogramData(responses):
 def getGoalHistogramData(responses):
 	"""
 	Goal Completion histogram chart on project detail page.
+	One grouped query: each primary goal's total and yes/partially/no counts.
 	Return: {obj} Counts and % of each Goal Completion rating across given responses.
 	"""
 	try:
-		snapshotResponses = responses.exclude(Q(primary_goal__isnull=True) | Q(primary_goal__name=''))
-		respsnapshotResponsesCount = snapshotResponses.count()
+		goals = list(responses.exclude(Q(primary_goal__isnull=True) | Q(primary_goal__name='')).order_by().values(goalName=F('primary_goal__name')).annotate(
+			goalTotal=Count('primary_goal'),
+			Yes=Count('id', filter=Q(goal_completed__name__iexact='yes')),
+			Partially=Count('id', filter=Q(goal_completed__name__iexact='partially')),
+			No=Count('id', filter=Q(goal_completed__name__iexact='no')),
+		).order_by('-goalTotal'))
 		
-		# Get unique list of primary goals and count each primary goal occurance.
-		# Then clean up names and change counts to percents
-		goals = list(snapshotResponses.values(goalName=F('primary_goal__name')).annotate(goalTotal=Count('primary_goal')).order_by('-goalTotal'))
+		responsesCount = sum([goal['goalTotal'] for goal in goals])
 		
-		# For each unique goal and count found:
+		# Clean up names and change counts to percents.
 		for goal in goals:
-			goalResponses = snapshotResponses.filter(primary_goal__name=goal['goalName']).select_related('goal_completed')
-			responseYesCount = goalResponses.filter(goal_completed__name__iexact='yes').count()
-			responsePartiallyCount = goalResponses.filter(goal_completed__name__iexact='yartially').count()
-			responseNoCount = goalResponses.filter(goal_completed__name__iexact='no').count()
-			
-			goal['Yes'] = responseYesCount
-			goal['Partially'] = responsePartiallyCount
-			goal['No'] = responseNoCount
-			goal['YesPercent'] = round((responseYesCount/goal['goalTotal'])*100)
-			goal['NoPercent'] = round((responseNoCount/goal['goalTotal'])*100)
-			goal['PartiallyPercent'] = round((responsePartiallyCount/goal['goalTotal'])*100)
+			goal['YesPercent'] = round((goal['Yes']/goal['goalTotal'])*100)
+			goal['NoPercent'] = round((goal['No']/goal['goalTotal'])*100)
+			goal['PartiallyPercent'] = round((goal['Partially']/goal['goalTotal'])*100)
 			goal['goalName'] = goal['goalName'].replace('_',' ').capitalize()
-			goal['goalPercent'] = round((goal['goalTotal']/respsnapshotResponsesCount)*100)
+			goal['goalPercent'] = round((goal['goalTotal']/responsesCount)*100)
 	except Exception as ex:
 		goals = None
 	
-	#print(json.dumps(data, indent=2))	
 	return goals
 
 
+def getHistogramData(responses, project=None, projectSnapshot=None):
+	"""
+	All 4 project detail histograms in 2 queries (rating counts + goals).
+	Cached per project and snapshot (period). The snapshot's updated_at is part of the key so recalculating
+	  the snapshot invalidates it. Unsaved (time machine) snapshots aren't cached.
+	Return: {obj} 'nps', 'umuxCap', 'umuxEase' and 'goal' histogram data.
+	"""
+	cacheKey = None
+	if project and projectSnapshot and projectSnapshot.id and projectSnapshot.updated_at:
+		cacheKey = f'histograms:{project.id}:{projectSnapshot.id}:{projectSnapshot.updated_at.timestamp()}'
+		data = cache.get(cacheKey)
+		if data:
+			return data
+	
+	try:
+		counts = getHistogramCounts(responses)
+	except Exception as ex:
+		counts = None
+	
+	data = {
+		'nps': getNpsHistogramData(responses, counts),
+		'umuxCap': getUmuxCapHistogramData(responses, counts),
+		'umuxEase': getUmuxEaseHistogramData(responses, counts),
+		'goal': getGoalHistogramData(responses),
+	}
+	
+	if cacheKey:
+		cache.set(cacheKey, data, HISTOGRAM_CACHE_SECONDS)
+	
+	return data
+
+
 def createReportPeriodChoices(startDate, endDate):
 	"""
 	Used for project tiles report_period select list.
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from metrics.response_data_helpers import recalculateAllSnapshots, RECALCULATE_SNAPSHOTS_WORKERS
+
+
+class Command(BaseCommand):
+	help = "Recalculates all snapshots for active projects (or the given projects) across a process pool, then their domains."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--workers', type=int, default=RECALCULATE_SNAPSHOTS_WORKERS, help='Number of worker processes. Use 1 to run serially.')
+		parser.add_argument('--projects', type=int, nargs='+', help='Only recalculate these project IDs.')
+
+	def handle(self, *args, **options):
+		if options['workers'] < 1:
+			raise CommandError('--workers must be 1 or more.')
+		
+		def progress(doneCount, totalCount, projectId, error):
+			if error:
+				self.stderr.write(f'{doneCount}/{totalCount} Project {projectId} failed: {error}')
+			else:
+				self.stdout.write(f'{doneCount}/{totalCount} Project {projectId} done.')
+		
+		projectsUpdated = recalculateAllSnapshots(projectIds=options['projects'], workers=options['workers'], progress=progress)
+		self.stdout.write(
+			self.style.SUCCESS(f'Successfully recalculated snapshots for {len(projectsUpdated)} projects.')
+		)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from metrics.models import ProjectYearSetting, ActivityLog, getImportScriptUser
+
+
+class Command(BaseCommand):
+	help = "Creates all active projects' year settings (baselines/targets) and domain snapshots for the year. Safe to run again."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--year', type=int, default=timezone.now().year, help='Year to set up. Default is this year.')
+
+	def handle(self, *args, **options):
+		t0 = time.time()
+		counts = ProjectYearSetting.rolloverYear(year=options['year'])
+		
+		try:
+			newActivity = ActivityLog.objects.create(
+				user = getImportScriptUser(),
+				comments = f"Import timer: Year rollover {options['year']}, {counts['created']} year settings created, {counts['updated']} updated, {counts['domainSnapshots']} domain snapshots: {round(time.time()-t0,1)}s"
+			)
+		except Exception as ex:
+			self.stderr.write(f'Year rollover logging ERROR: {str(ex)}')
+		
+		self.stdout.write(
+			self.style.SUCCESS(f"Year {options['year']}: {counts['created']} year settings created, {counts['updated']} updated, {counts['domainSnapshots']} domain snapshots.")
+		)
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotDirtyPeriod',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dirtied_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('period_type', models.CharField(choices=[('month', 'Month'), ('quarter', 'Quarter')], max_length=12)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('period', models.PositiveSmallIntegerField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_dirty_period_project', to='metrics.project')),
+            ],
+            options={
+                'ordering': ['dirtied_at'],
+                'unique_together': {('project', 'period_type', 'year', 'period')},
+            },
+        ),
+    ]
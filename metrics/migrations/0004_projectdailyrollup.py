@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.conf import settings
+
+
+def backfillDailyRollups(apps, schema_editor):
+    """
+    Build the daily rollups from all existing responses, grouped by project and local day.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO metrics_projectdailyrollup (
+                updated_at, project_id, day, latest_date, response_count, meaningful_response_count,
+                nps_count, nps_promoter_count, nps_passive_count, nps_detractor_count,
+                umux_count, umux_scores_sum, umux_scores_sum_squares,
+                umux_capability_count, umux_capability_sum, umux_capability_sum_squares,
+                umux_ease_of_use_count, umux_ease_of_use_sum, umux_ease_of_use_sum_squares,
+                goal_completed_count, goal_completed_yes_count
+            )
+            SELECT
+                NOW(), c.project_id, (r.date AT TIME ZONE %s)::date, MAX(r.date), COUNT(*),
+                COUNT(*) FILTER (WHERE r.goal_completed_id IS NOT NULL OR r.umux_ease_of_use IS NOT NULL OR r.nps IS NOT NULL),
+                COUNT(r.nps),
+                COUNT(*) FILTER (WHERE r.nps_category = 'promoter'),
+                COUNT(*) FILTER (WHERE r.nps_category = 'passive'),
+                COUNT(*) FILTER (WHERE r.nps_category = 'detractor'),
+                COUNT(r.umux_score), COALESCE(SUM(r.umux_score), 0), COALESCE(SUM(r.umux_score * r.umux_score), 0),
+                COUNT(r.umux_capability), COALESCE(SUM(r.umux_capability), 0), COALESCE(SUM(r.umux_capability * r.umux_capability), 0),
+                COUNT(r.umux_ease_of_use), COALESCE(SUM(r.umux_ease_of_use), 0), COALESCE(SUM(r.umux_ease_of_use * r.umux_ease_of_use), 0),
+                COUNT(r.goal_completed_id),
+                COUNT(*) FILTER (WHERE UPPER(g.name) = 'YES')
+            FROM metrics_response r
+            INNER JOIN metrics_campaign c ON c.id = r.campaign_id
+            LEFT JOIN metrics_goalcompleted g ON g.id = r.goal_completed_id
+            WHERE c.project_id IS NOT NULL
+            GROUP BY c.project_id, (r.date AT TIME ZONE %s)::date
+        """, [settings.TIME_ZONE, settings.TIME_ZONE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0003_snapshotdirtyperiod_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+                ('latest_date', models.DateTimeField(blank=True, null=True)),
+                ('response_count', models.PositiveIntegerField(default=0)),
+                ('meaningful_response_count', models.PositiveIntegerField(default=0)),
+                ('nps_count', models.PositiveIntegerField(default=0)),
+                ('nps_promoter_count', models.PositiveIntegerField(default=0)),
+                ('nps_passive_count', models.PositiveIntegerField(default=0)),
+                ('nps_detractor_count', models.PositiveIntegerField(default=0)),
+                ('umux_count', models.PositiveIntegerField(default=0)),
+                ('umux_scores_sum', models.FloatField(default=0)),
+                ('umux_scores_sum_squares', models.FloatField(default=0)),
+                ('umux_capability_count', models.PositiveIntegerField(default=0)),
+                ('umux_capability_sum', models.FloatField(default=0)),
+                ('umux_capability_sum_squares', models.FloatField(default=0)),
+                ('umux_ease_of_use_count', models.PositiveIntegerField(default=0)),
+                ('umux_ease_of_use_sum', models.FloatField(default=0)),
+                ('umux_ease_of_use_sum_squares', models.FloatField(default=0)),
+                ('goal_completed_count', models.PositiveIntegerField(default=0)),
+                ('goal_completed_yes_count', models.PositiveIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_daily_rollup_project', to='metrics.project')),
+            ],
+            options={
+                'ordering': ['project', 'day'],
+                'unique_together': {('project', 'day')},
+            },
+        ),
+        migrations.RunPython(backfillDailyRollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:53
+
+from django.conf import settings
+import django.contrib.postgres.fields
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('metrics', '0004_projectdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeMachineReport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('name', models.CharField(blank=True, max_length=128)),
+                ('end_date', models.DateField()),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('project_ids', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), blank=True, default=list, size=None)),
+                ('results', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='time_machine_report_created_by', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
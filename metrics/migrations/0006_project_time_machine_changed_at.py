@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0005_timemachinereport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='time_machine_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
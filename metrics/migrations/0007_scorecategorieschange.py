@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0006_project_time_machine_changed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreCategoriesChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -4,10 +4,14 @@ import dateutil.parser
 import io
 import json
 import logging
+import multiprocessing
 import operator
 import os
+import queue
+import re
 import requests
 import sys
+import threading
 import time
 import traceback
 import usabilla as ub
@@ -17,10 +21,13 @@ import pandas as pd
 from user_agents import parse
 from datetime import datetime, timedelta
 from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
+from itertools import islice
 
 from django.conf import settings
 from django.core.mail import EmailMessage
+from django.db import connections, transaction
 from django.db.models import Count, Value, Q, Avg, F
 from django.utils import timezone
 
@@ -31,6 +38,111 @@ from research.helpers import sendEmail
 CAMPAIGNS_ID_NAME_MAP = {}
 BUTTONS_ID_CAMPAIGNS_ID_MAP = {}
 
+# How many API results we check against the DB and insert per round trip.
+USABILLA_IMPORT_CHUNK_SIZE = getattr(settings, 'USABILLA_IMPORT_CHUNK_SIZE', 500)
+# How many campaigns we fetch from the API at the same time, and how many times we retry
+#  a page when the API rate limits us (429) or has a hiccup (5xx).
+USABILLA_IMPORT_WORKERS = getattr(settings, 'USABILLA_IMPORT_WORKERS', 4)
+USABILLA_IMPORT_MAX_RETRIES = getattr(settings, 'USABILLA_IMPORT_MAX_RETRIES', 5)
+USABILLA_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# How long the shared dimension cache (used by single survey submits) is kept before reloading.
+IMPORT_DIMENSION_CACHE_SECONDS = getattr(settings, 'IMPORT_DIMENSION_CACHE_SECONDS', 600)
+# Usabilla CSV export columns (see convertCsvToData), they have at least the ones up to 'Email (Yes/No)'.
+CSV_IMPORT_COLUMNS = ['Campaign', 'Campaign ID', 'Response ID', 'Date', 'NPS', 'UM UX Lite - Capability', 'UM UX Lite - Ease of Use', 'Suggestion to Improve', 'User Role', 'Primary Goal', 'Other (Write-in)', 'Goal Completed', 'Not Completed Reason', 'Final Comments', 'Email (Yes/No)', 'URL', 'Location', 'Total Time', 'Device Type', 'Browser', 'System']
+CSV_IMPORT_MIN_COLUMNS = 15
+SHARED_DIMENSION_CACHE = {}
+# How many processes a full snapshot recalculation is split across.
+RECALCULATE_SNAPSHOTS_WORKERS = getattr(settings, 'RECALCULATE_SNAPSHOTS_WORKERS', 4)
+
+
+class ImportDimensionCache:
+	"""
+	In memory get_or_create for the small lookup tables every imported response points to
+	  (UserRole, PrimaryGoal, GoalCompleted, Campaign), so a response costs no lookup queries.
+	Tables are loaded once into dicts. Misses are created in batches with createMissing(),
+	  or one at a time with get() as a fallback.
+	Create one per import run, or use getImportDimensionCache() for one-off submits.
+	"""
+	def __init__(self):
+		self.createdAt = time.time()
+		self.items = {}
+
+		for model in [UserRole, PrimaryGoal, GoalCompleted]:
+			self.items[model] = {obj.name: obj for obj in model.objects.all()}
+
+		self.items[Campaign] = {obj.key: obj for obj in Campaign.objects.filter(key__isnull=False)}
+
+		# Project of the first campaign for each Usabilla uid, used for new campaigns of that uid.
+		self.uidProjectIds = {}
+		for uid, projectId in Campaign.objects.filter(uid__isnull=False).order_by('uid', 'id').values_list('uid', 'project_id'):
+			self.uidProjectIds.setdefault(uid, projectId)
+
+
+	def get(self, model, value, defaults=None):
+		"""
+		Cached get_or_create. Campaigns are looked up by 'key', everything else by 'name'.
+		:param defaults: Dict or function returning a dict, only used if we have to create it.
+		Return: {obj} Model object, or None if there's no value.
+		"""
+		if value is None:
+			return None
+
+		items = self.items[model]
+
+		if value not in items:
+			if callable(defaults):
+				defaults = defaults()
+
+			lookupField = 'key' if model is Campaign else 'name'
+			items[value] = model.objects.get_or_create(defaults=defaults, **{lookupField: value})[0]
+
+			if model is Campaign:
+				self.uidProjectIds.setdefault(items[value].uid, items[value].project_id)
+
+		return items[value]
+
+
+	def createMissing(self, model, values):
+		"""
+		Create all values we don't have yet for a name based lookup table in one insert.
+		Values too long for the field are skipped, same as get_or_create failing on them.
+		"""
+		maxLength = model._meta.get_field('name').max_length
+		missing = set([v for v in values if isinstance(v, str) and v not in self.items[model] and len(v) <= maxLength])
+
+		if not missing:
+			return
+
+		model.objects.bulk_create([model(name=v) for v in missing], ignore_conflicts=True)
+
+		for obj in model.objects.filter(name__in=missing):
+			self.items[model][obj.name] = obj
+
+
+	def primeFromResponses(self, responses):
+		"""
+		Batch create the lookup values a chunk of API responses will need before converting them.
+		"""
+		self.createMissing(UserRole, [(r.get('data') or {}).get('Role') for r in responses])
+		self.createMissing(PrimaryGoal, [getPrimaryGoalName(r) for r in responses])
+		self.createMissing(GoalCompleted, [getGoalCompletedName(r) for r in responses])
+
+
+def getImportDimensionCache():
+	"""
+	Process-wide dimension cache for code paths that insert one response at a time
+	  (survey submits), reloaded every IMPORT_DIMENSION_CACHE_SECONDS to pick up admin changes.
+	Return: {ImportDimensionCache}
+	"""
+	cache = SHARED_DIMENSION_CACHE.get('cache')
+
+	if not cache or time.time() - cache.createdAt > IMPORT_DIMENSION_CACHE_SECONDS:
+		cache = ImportDimensionCache()
+		SHARED_DIMENSION_CACHE['cache'] = cache
+
+	return cache
+
+
 def cleanArray(arr):
 	"""
 	Simply util that removes empty items from an array and returns cleaned array
@@ -48,14 +160,29 @@ def setSinceDate(date = None):
 	return int(date.timestamp() * 1000)
 
 
-def conectToUsabilla():
+def createUsabillaClient():
+	"""
+	Create an API client with access key and secret key.
+	Each client gets its own HTTP session (the library shares one by default) so clients
+	  can be used from separate threads.
+	USABILLA_API_HOST/USABILLA_API_PROTOCOL settings can point it at a local stub for testing.
+	"""
+	apiClient = ub.APIClient(settings.USABILLA_ACCESS_KEY, settings.USABILLA_SECRET_KEY)
+	apiClient.session = requests.Session()
+	apiClient.host = getattr(settings, 'USABILLA_API_HOST', apiClient.host)
+	apiClient.host_protocol = getattr(settings, 'USABILLA_API_PROTOCOL', apiClient.host_protocol)
+
+	return apiClient
+
+
+def conectToUsabilla(clientFactory=createUsabillaClient):
 	"""
 	Create an API client with access key and secret key.
 	Parse the list of our campaigns in Usabilla and convert the ID to the name.
 	This is the only place where ID/KEY is associated to the name, so we make a map of it
 	  for use when we get each response, if we have to add a new campaign, we set the key (usabilla ID) and name.
 	"""
-	apiClient = ub.APIClient(settings.USABILLA_ACCESS_KEY, settings.USABILLA_SECRET_KEY)
+	apiClient = clientFactory()
 	
 	usabillaCampaigns = apiClient.get_resource(apiClient.SCOPE_LIVE, apiClient.PRODUCT_WEBSITES, apiClient.RESOURCE_CAMPAIGN, iterate=True)
 	
@@ -144,23 +271,30 @@ def createCampaignKey(id, role=None, version='', company=''):
 	return campaignKey
 
 
-def getCampaign(key, uid):
+def getNewCampaignDefaults(uid, projectId):
+	return {
+		'uid': uid,
+		'project_id': projectId,
+		'latest_response_date': timezone.make_aware(datetime(2016,1,1)),
+		'latest_feedback_response_date': timezone.make_aware(datetime(2016,1,1)),
+		'latest_other_response_date': timezone.make_aware(datetime(2016,1,1)),
+		'created_by': getImportScriptUser(),
+		'updated_by': getImportScriptUser(),
+	}
+
+
+def getCampaign(key, uid, cache=None):
+	if cache:
+		return cache.get(Campaign, key, defaults=lambda: getNewCampaignDefaults(uid, cache.uidProjectIds.get(uid)))
+	
 	try:
-		project = Campaign.objects.filter(uid=uid).first().project
+		projectId = Campaign.objects.filter(uid=uid).first().project_id
 	except:
-		project = None
+		projectId = None
 	
 	campaign, created = Campaign.objects.get_or_create(
 		key = key,
-		defaults = {
-			'uid': uid,
-			'project': project,
-			'latest_response_date': timezone.make_aware(datetime(2016,1,1)),
-			'latest_feedback_response_date': timezone.make_aware(datetime(2016,1,1)),
-			'latest_other_response_date': timezone.make_aware(datetime(2016,1,1)),
-			'created_by': getImportScriptUser(),
-			'updated_by': getImportScriptUser(),
-		}
+		defaults = getNewCampaignDefaults(uid, projectId)
 	)
 	return campaign
 
@@ -172,8 +306,10 @@ def getNps(v):
 		return None
 
 
-def getRole(v):
+def getRole(v, cache=None):
 	try:
+		if cache:
+			return cache.get(UserRole, v)
 		return UserRole.objects.get_or_create(name = v)[0]
 	except:
 		return None
@@ -270,7 +406,7 @@ def getEmailProvided(r):
 		return False
 
 
-def getGoalCompleted(r):
+def getGoalCompletedName(r):
 	fieldnameArr = [
 		'Did_you_find_the_help_you_needed',
 		'Goal_complete',
@@ -281,12 +417,25 @@ def getGoalCompleted(r):
 		'Goal_completed_1',
 		'Goal_completed_2',	
 	]
-	val = findAValue(r['data'], fieldnameArr)
+	try:
+		val = findAValue(r['data'], fieldnameArr)
+		if val.strip() != '':
+			return val
+	except:
+		pass
+	
+	return None
 
-	if val.strip() != '':
-		return GoalCompleted.objects.get_or_create(name = val)[0]
-	else:
+
+def getGoalCompleted(r, cache=None):
+	val = getGoalCompletedName(r)
+
+	if val is None:
 		return None
+	elif cache:
+		return cache.get(GoalCompleted, val)
+	else:
+		return GoalCompleted.objects.get_or_create(name = val)[0]
 
 
 def getGoalNotCompletedReason(r):
@@ -314,7 +463,7 @@ def getImprovementSuggestion(r):
 	return findAValue(r['data'], fieldnameArr)
 
 
-def getPrimaryGoal(r):
+def getPrimaryGoalName(r):
 	fieldnameArr = [
 		'goal',
 		'Goal',
@@ -333,7 +482,16 @@ def getPrimaryGoal(r):
 	]
 	
 	try:
-		val = findAValue(r['data'], fieldnameArr).lower()
+		return findAValue(r['data'], fieldnameArr).lower()
+	except:
+		return None
+
+
+def getPrimaryGoal(r, cache=None):
+	try:
+		val = getPrimaryGoalName(r)
+		if cache:
+			return cache.get(PrimaryGoal, val)
 		return PrimaryGoal.objects.get_or_create(name=val)[0]
 	except:
 		return None
@@ -384,7 +542,7 @@ def getTime(r):
 		return 0
 
 
-def convertCsvToData(row):
+def convertCsvToData(row, cache=None):
 	"""
 	Field indexes reference:
 		0 Campaign
@@ -411,22 +569,27 @@ def convertCsvToData(row):
 	"""
 	
 	# Pass if we already have this response imported.
-	if VoteResponse.objects.filter(uid = row[2]).exists():
+	# With a cache, the caller is expected to have skipped existing uids in bulk.
+	if not cache and VoteResponse.objects.filter(uid = row[2]).exists():
 		return
 	
-	campaign, created = Campaign.objects.get_or_create(
-		key = row[0],
-		defaults = {
-			'uid': row[1],
-			'latest_response_date': timezone.make_aware(datetime(2000,1,1)),
-			'created_by': getImportScriptUser(),
-			'updated_by': getImportScriptUser(),
-		}
-	)
-
-	userRole, created = UserRole.objects.get_or_create(name = row[8])
-	primaryGoal, created = PrimaryGoal.objects.get_or_create(name = row[9])
-	goalCompleted, created = GoalCompleted.objects.get_or_create(name = row[11])
+	campaignDefaults = lambda: {
+		'uid': row[1],
+		'latest_response_date': timezone.make_aware(datetime(2000,1,1)),
+		'created_by': getImportScriptUser(),
+		'updated_by': getImportScriptUser(),
+	}
+	
+	if cache:
+		campaign = cache.get(Campaign, row[0], defaults=campaignDefaults)
+		userRole = cache.get(UserRole, row[8])
+		primaryGoal = cache.get(PrimaryGoal, row[9])
+		goalCompleted = cache.get(GoalCompleted, row[11])
+	else:
+		campaign, created = Campaign.objects.get_or_create(key = row[0], defaults = campaignDefaults())
+		userRole, created = UserRole.objects.get_or_create(name = row[8])
+		primaryGoal, created = PrimaryGoal.objects.get_or_create(name = row[9])
+		goalCompleted, created = GoalCompleted.objects.get_or_create(name = row[11])
 	
 	#locationData = createLocationObjects(row[16])
 						
@@ -466,13 +629,15 @@ def convertCsvToData(row):
 		umuxEaseUse = int(row[6])
 	except:
 		umuxEaseUse = None
-		
+	
+	date = parseCsvDate(row[3])
+	
 	# Build Response data object and return to sender.
 	responseData = {
 		#'browser': browser,
 		'campaign': campaign,
 		'comments': row[13],
-		'date': row[3],
+		'date': date,
 		#'device_type': deviceType,
 		'email_provided': email,
 		'goal_completed': goalCompleted,
@@ -491,12 +656,96 @@ def convertCsvToData(row):
 		'umux_capability': umuxCapability,
 		'umux_ease_of_use': umuxEaseUse,
 		'uid': row[2],
-		'user_role': userRole
+		'user_role': userRole,
+		'raw_data': convertCsvRowToRawData(row, date),
 	}
 	
 	return responseData
 
 
+def parseCsvDate(value):
+	"""
+	CSV dates can be ISO strings with or without timezone, naive ones are in our timezone.
+	Return: {datetime} Timezone aware date.
+	"""
+	date = dateutil.parser.parse(value)
+	
+	if timezone.is_naive(date):
+		date = timezone.make_aware(date)
+	
+	return date
+
+
+def convertCsvRowToRawData(row, date):
+	"""
+	Build raw_data for a CSV row in the same shape as the API, using field names the
+	  get<Field>() parsers know, so CSV responses can be re-parsed like API ones.
+	"""
+	return {
+		'id': row[2],
+		'date': date.isoformat(),
+		'campaignId': row[1],
+		'data': {
+			'nps': row[4],
+			'UMUX_LITE_capabilities': row[5],
+			'UMUX_LITE_ease_of_use': row[6],
+			'suggestions_to_improve': row[7],
+			'Role': row[8],
+			'primary_goal': row[9],
+			'primary_goal_other': row[10],
+			'goal_completed': row[11],
+			'reason_not_complete': row[12],
+			'comments': row[13],
+			'email': 'yes' if row[14].lower() == 'yes' else '',
+		},
+		'source': 'csv',
+	}
+
+
+def isCsvHeaderRow(row):
+	"""
+	Compare the whole row to the export's column names, ignoring case, spacing and punctuation, so a header
+	  with slightly different names is still skipped instead of imported. Most of the names have to match.
+	Return: {bool} If the (first) row is a header.
+	"""
+	normalize = lambda value: re.sub(r'[^a-z0-9]', '', value.lower())
+	matches = [normalize(value) == normalize(columnName) for value, columnName in zip(row, CSV_IMPORT_COLUMNS)]
+	
+	return len(matches) > 0 and sum(matches) > len(matches) / 2
+
+
+def validateCsvRow(row):
+	"""
+	Check a CSV row (see convertCsvToData for columns) has what we need to import it.
+	Return: {string} Why the row can't be imported, or None if it's fine.
+	"""
+	if len(row) < CSV_IMPORT_MIN_COLUMNS:
+		return f'Expected at least {CSV_IMPORT_MIN_COLUMNS} columns, got {len(row)}'
+	
+	if not row[0].strip() or not row[2].strip():
+		return 'Missing campaign or response ID'
+	
+	try:
+		parseCsvDate(row[3])
+	except Exception as ex:
+		return f'Invalid date: {row[3]}'
+	
+	for idx, minVal, maxVal in [(4, 0, 10), (5, 1, 7), (6, 1, 7)]:
+		if row[idx].strip() == '':
+			continue
+		try:
+			if not minVal <= int(row[idx]) <= maxVal:
+				return f'Value out of range in column {idx}: {row[idx]}'
+		except Exception as ex:
+			return f'Invalid number in column {idx}: {row[idx]}'
+	
+	for idx, model, fieldName in [(0, Campaign, 'key'), (2, Response, 'uid'), (8, UserRole, 'name'), (9, PrimaryGoal, 'name'), (11, GoalCompleted, 'name')]:
+		if len(row[idx]) > model._meta.get_field(fieldName).max_length:
+			return f'Value too long in column {idx}'
+	
+	return None
+
+
 def convertDataToCsv(campaigns=None, projects=None, startDate=None, endDate=None, orderBy=None):
 	"""
 	0 Campaign
@@ -612,7 +861,7 @@ def convertDataToCsv(campaigns=None, projects=None, startDate=None, endDate=None
 	return responseArr
 
 
-def convertVoteResponseToData(r):
+def convertVoteResponseToData(r, cache=None):
 	"""
 	Sample row:
 		{
@@ -641,12 +890,12 @@ def convertVoteResponseToData(r):
 	except:
 		return
 	
-	role = getRole(rd.get('Role'))
+	role = getRole(rd.get('Role'), cache)
 	version = rd.get('Version', '')
 	company = rd.get('Company', '')
 	campaignKey = createCampaignKey(r['campaignId'], role=role, version=version, company=company)
 	
-	campaign = getCampaign(campaignKey, r['campaignId'])
+	campaign = getCampaign(campaignKey, r['campaignId'], cache)
 	nps = getNps(rd.get('nps'))
 	
 	#deviceData = getDeviceData(r['userAgent'])
@@ -655,11 +904,11 @@ def convertVoteResponseToData(r):
 	umuxCapability = getUmuxCapability(r)
 	umuxEaseUse = getUmuxEaseUse(r)
 	emailProvided = getEmailProvided(r)
-	goalCompleted = getGoalCompleted(r)
+	goalCompleted = getGoalCompleted(r, cache)
 	goalNotCompletedReason = getGoalNotCompletedReason(r)
 	improvementSuggestion = getImprovementSuggestion(r)
 	primaryGoalOther = getPrimaryGoalOther(r)
-	primaryGoal = getPrimaryGoal(r)	
+	primaryGoal = getPrimaryGoal(r, cache)	
 	#url = getUrl(r.get('url', ''))
 	#totalTime = getTime(r)
 	
@@ -694,7 +943,7 @@ def convertVoteResponseToData(r):
 	return responseData
 
 
-def convertFeedbackResponseToData(r):
+def convertFeedbackResponseToData(r, cache=None):
 	"""
 	Sample row:
 	{
@@ -719,11 +968,11 @@ def convertFeedbackResponseToData(r):
 	except:
 		return
 	
-	role = getRole(rd.get('Role'))
+	role = getRole(rd.get('Role'), cache)
 	version = rd.get('Version', '')
 	company = rd.get('Company', '')
 	campaignKey = createCampaignKey(r['campaignId'], role=role, version=version, company=company)
-	campaign = getCampaign(campaignKey, r['campaignId'])
+	campaign = getCampaign(campaignKey, r['campaignId'], cache)
 	comments = getComments(r)
 	feedbackType = getFeedbackType(r)
 	emailProvided = getEmailProvided(r)
@@ -743,7 +992,7 @@ def convertFeedbackResponseToData(r):
 	return responseData
 
 
-def convertOtherResponseToData(r):
+def convertOtherResponseToData(r, cache=None):
 	"""
 	Sample row:
 	{
@@ -762,11 +1011,11 @@ def convertOtherResponseToData(r):
 	except:
 		return
 	
-	role = getRole(rd.get('Role'))
+	role = getRole(rd.get('Role'), cache)
 	version = rd.get('Version', '')
 	company = rd.get('Company', '')
 	campaignKey = createCampaignKey(r['campaignId'], role=role, version=version, company=company)
-	campaign = getCampaign(campaignKey, r['campaignId'])
+	campaign = getCampaign(campaignKey, r['campaignId'], cache)
 	
 	# All data in in raw_data. We just pull out special fields we use to display responses.
 	responseData = {
@@ -908,24 +1157,304 @@ def convertUsabillaResponseToCsvRow(r):
 	return rowArr
 
 
+def chunkIterable(iterable, size):
+	"""
+	Yield lists of up to 'size' items from any iterable (incl. the API's paged generators)
+	  so we only ever hold one chunk of results in memory.
+	"""
+	iterator = iter(iterable)
+
+	while True:
+		chunk = list(islice(iterator, size))
+		if not chunk:
+			return
+		yield chunk
+
+
+def trackProjectTouched(projectsTouched, projectsTouchedData, projectId, date):
+	"""
+	Flag the project + quarter + month of a response date so we update those snapshots after.
+	See updateProjectSnapshots for a sample of projectsTouchedData.
+	"""
+	if not projectId:
+		return
+
+	# Snapshot periods are in our timezone, same as the date__year/quarter/month filters used to build them.
+	if timezone.is_aware(date):
+		date = timezone.localtime(date)
+
+	responseYearQuarter = (pd.Timestamp(date).year, pd.Timestamp(date).quarter)
+	responseYearMonth = (pd.Timestamp(date).year, pd.Timestamp(date).month)
+
+	# If it's not in the array already, add it.
+	# Else, check if the month or quarter is there already and add that.
+	if projectId not in projectsTouched:
+		projectsTouched.append(projectId)
+		projectsTouchedData[projectId] = {
+			'quarters': [responseYearQuarter],
+			'months': [responseYearMonth],
+		}
+	else:
+		if responseYearQuarter not in projectsTouchedData[projectId]['quarters']:
+			projectsTouchedData[projectId]['quarters'].append(responseYearQuarter)
+
+		if responseYearMonth not in projectsTouchedData[projectId]['months']:
+			projectsTouchedData[projectId]['months'].append(responseYearMonth)
+
+
+def getExistingUids(model, uids):
+	"""
+	One query to find which of the given response uids we already have.
+	Return: {set} uids that exist in the DB.
+	"""
+	return set(model.objects.filter(uid__in=uids).values_list('uid', flat=True))
+
+
+def bulkCreateResponses(model, responseDataArr, chunkSize=USABILLA_IMPORT_CHUNK_SIZE):
+	"""
+	Insert converted response data with bulk_create. bulk_create skips save(), so we
+	  set calculated fields (NPS category, UMUX score) here.
+	Conflicting uids are ignored, so two imports running at once can't fail each other.
+	  bulk_create doesn't tell us which rows it skipped, so uids that already existed
+	  before the insert are left out of the returned list.
+	If the batch fails for another reason (bad value in a row) we fall back to inserting
+	  one by one so a single bad response doesn't lose the whole chunk.
+	Return: {array} Response objects that were inserted.
+	"""
+	responses = []
+
+	for responseData in responseDataArr:
+		response = model(**responseData)
+		if hasattr(response, 'setCalculatedFields'):
+			response.setCalculatedFields()
+		responses.append(response)
+
+	if not responses:
+		return []
+
+	try:
+		existingUids = getExistingUids(model, [response.uid for response in responses])
+		model.objects.bulk_create(responses, batch_size=chunkSize, ignore_conflicts=True)
+		return [response for response in responses if response.uid not in existingUids]
+	except Exception as ex:
+		if settings.DEBUG:
+			print(f'>> Bulk insert failed, inserting one by one: {ex}')
+
+	savedResponses = []
+	for response in responses:
+		try:
+			response.save()
+			savedResponses.append(response)
+		except Exception as ex:
+			if settings.DEBUG:
+				print(f'Error importing response {response.uid}: {ex}')
+
+	return savedResponses
+
+
+def insertVoteResponsesChunk(chunk, chunkSize=USABILLA_IMPORT_CHUNK_SIZE, cache=None):
+	"""
+	Convert and insert a chunk of Usabilla campaign (vote) results.
+	Return: {array} VoteResponse objects inserted.
+	"""
+	existingUids = getExistingUids(VoteResponse, [cr.get('id') for cr in chunk])
+	responseDataArr = []
+	
+	if cache:
+		cache.primeFromResponses([cr for cr in chunk if cr.get('id') not in existingUids])
+
+	for cr in chunk:
+		if cr.get('id') in existingUids:
+			continue
+
+		# Also skips duplicates within the chunk.
+		existingUids.add(cr.get('id'))
+
+		responseDataArgs = convertVoteResponseToData(cr, cache)
+		if responseDataArgs:
+			responseDataArr.append(responseDataArgs)
+
+	return bulkCreateResponses(VoteResponse, responseDataArr, chunkSize)
+
+
+def insertFeedbackResponsesChunk(chunk, buttonId, chunkSize=USABILLA_IMPORT_CHUNK_SIZE, cache=None):
+	"""
+	Convert and insert a chunk of Usabilla feedback button results.
+	Return: {array} FeedbackResponse objects inserted.
+	"""
+	existingUids = getExistingUids(FeedbackResponse, [cr.get('id') for cr in chunk])
+	responseDataArr = []
+
+	for cr in chunk:
+		if cr.get('id') in existingUids:
+			continue
+
+		existingUids.add(cr.get('id'))
+
+		# It's expecting object with some fields and survey data in 'data'
+		responseDataArgs = convertFeedbackResponseToData({
+			'id': cr['id'],
+			'date': cr['date'],
+			'campaignId': BUTTONS_ID_CAMPAIGNS_ID_MAP[buttonId],
+			'data': cr,
+		}, cache)
+		if responseDataArgs:
+			responseDataArr.append(responseDataArgs)
+
+	savedResponses = bulkCreateResponses(FeedbackResponse, responseDataArr, chunkSize)
+
+	# Associate the button to any campaign that doesn't have it yet.
+	campaignsMissingButton = set([r.campaign for r in savedResponses if not r.campaign.usabilla_button_id])
+	if campaignsMissingButton:
+		Campaign.objects.filter(id__in=[c.id for c in campaignsMissingButton]).update(usabilla_button_id=buttonId, updated_at=timezone.now())
+		
+		# Keep cached campaign objects in sync.
+		for campaign in campaignsMissingButton:
+			campaign.usabilla_button_id = buttonId
+
+	return savedResponses
+
+
+def sendUsabillaRequest(apiClient, url, maxRetries=USABILLA_IMPORT_MAX_RETRIES):
+	"""
+	Send one API request, backing off exponentially (or per Retry-After header) when the API
+	  rate limits us or returns a temporary error.
+	Return: {obj} The API JSON response.
+	"""
+	attempt = 0
+
+	while True:
+		try:
+			return apiClient.send_signed_request(url)
+		except requests.exceptions.HTTPError as ex:
+			statusCode = getattr(ex.response, 'status_code', None)
+			if attempt >= maxRetries or statusCode not in USABILLA_RETRY_STATUS_CODES:
+				raise
+
+			try:
+				waitTime = float(ex.response.headers.get('Retry-After'))
+			except:
+				waitTime = 2 ** attempt
+
+			if settings.DEBUG:
+				print(f'>> API returned {statusCode}, retrying in {waitTime}s')
+
+			time.sleep(waitTime)
+			attempt += 1
+
+
+def fetchUsabillaResults(apiClient, resource, resourceId, sinceDate, maxRetries=USABILLA_IMPORT_MAX_RETRIES):
+	"""
+	Same as the library's get_resource(iterate=True), but pages are requested by us so a
+	  rate limited page is retried instead of killing the whole campaign.
+	Return: {generator} Yields each result item.
+	"""
+	url = apiClient.handle_id(apiClient.check_resource_validity(apiClient.SCOPE_LIVE, apiClient.PRODUCT_WEBSITES, resource), resourceId)
+	hasMore = True
+
+	while hasMore:
+		apiClient.set_query_parameters({'since': sinceDate})
+		results = sendUsabillaRequest(apiClient, url, maxRetries)
+		hasMore = results['hasMore']
+		sinceDate = results['lastTimestamp']
+
+		for item in results['items']:
+			yield item
+
+
+def queueUsabillaChunk(chunksQueue, item, stopEvent):
+	"""
+	Put an item on the writer's queue, giving up if the writer has stopped so workers
+	  don't wait forever on a full queue.
+	"""
+	while not stopEvent.is_set():
+		try:
+			chunksQueue.put(item, timeout=1)
+			return True
+		except queue.Full:
+			pass
+
+	return False
+
+
+def fetchUsabillaJob(job, chunksQueue, stopEvent, clientFactory, threadData, chunkSize=USABILLA_IMPORT_CHUNK_SIZE):
+	"""
+	Worker thread: fetch all results for one campaign or feedback button and put them on the
+	  queue in chunks for the writer. Never touches the DB.
+	"""
+	try:
+		# One client per worker thread, the client keeps query params between requests.
+		if not hasattr(threadData, 'apiClient'):
+			threadData.apiClient = clientFactory()
+
+		results = fetchUsabillaResults(threadData.apiClient, job['resource'], job['id'], setSinceDate(job['sinceDate']))
+
+		for chunk in chunkIterable(results, chunkSize):
+			if not queueUsabillaChunk(chunksQueue, {'job': job, 'chunk': chunk}, stopEvent):
+				return
+	except Exception as ex:
+		queueUsabillaChunk(chunksQueue, {'job': job, 'error': ex}, stopEvent)
+
+	queueUsabillaChunk(chunksQueue, {'job': job, 'done': True}, stopEvent)
+
+
+def getUsabillaFetchJobs(campaignsArr):
+	"""
+	Build the list of unique feedback buttons and vote campaigns to fetch results for.
+	Several of our campaigns can share a uid or button ID, we only fetch each once.
+	Return: {array} Job objects.
+	"""
+	jobs = []
+	campaignsProcessed = []
+	campaignButtonsProcessed = []
+
+	for campaign in campaignsArr:
+		if campaign['usabilla_button_id'] and campaign['usabilla_button_id'] not in campaignButtonsProcessed:
+			jobs.append({
+				'type': 'feedback',
+				'id': campaign['usabilla_button_id'],
+				'resource': ub.APIClient.RESOURCE_FEEDBACK,
+				'sinceDate': campaign['latest_feedback_response_date'],
+			})
+			campaignButtonsProcessed.append(campaign['usabilla_button_id'])
+
+		if campaign['uid'] and campaign['uid'] not in campaignsProcessed:
+			jobs.append({
+				'type': 'vote',
+				'id': campaign['uid'],
+				'resource': ub.APIClient.RESOURCE_CAMPAIGN_RESULT,
+				'sinceDate': campaign['latest_response_date'],
+			})
+			campaignsProcessed.append(campaign['uid'])
+
+	return jobs
+
+
 ####
-##  4 main actions from data source triangle: 
+##  4 main actions from data source triangle:
 ##  [Usabilla API] -- [CSV to import] -- [Alexandria Data models]
 ####
 
 
-def importUsabillaFromApi(campaignsArr):
+def importUsabillaFromApi(campaignsArr, chunkSize=USABILLA_IMPORT_CHUNK_SIZE, workers=USABILLA_IMPORT_WORKERS, clientFactory=createUsabillaClient):
 	"""
 	Uses Usabilla API (https://developers.usabilla.com/#get-campaigns) to get campaign
 	responses, and inserts them into AL.
-	
-	:param campaigns: An array of objects to fetch: 
+	Campaign results are fetched in parallel by a pool of worker threads, and handed over
+	  in chunks to this (single) thread which does all the DB inserts.
+	Each chunk does one query to find uids we already have, then one bulk insert.
+
+	:param campaigns: An array of objects to fetch:
 		id: <campaignid>,
 		date: <datetime object>
+	:param chunkSize: How many API results to check and insert per DB round trip.
+	:param workers: How many campaigns to fetch from the API at the same time.
+	:param clientFactory: Function that returns a new API client. Can be swapped for a stub client.
 	"""
 	t0 = time.time()
 	
-	apiClient = conectToUsabilla()
+	conectToUsabilla(clientFactory)
+	cache = ImportDimensionCache()
 	
 	try:
 		newActivity = ActivityLog.objects.create(
@@ -943,8 +1472,6 @@ def importUsabillaFromApi(campaignsArr):
 	projectsTouchedData = {}
 	campaignUidsTouched = []
 	buttonIdsTouched = []
-	campaignsProcessed = []
-	campaignButtonsProcessed = []
 	processedCount = 0
 	insertedCount = 0
 	t0 = time.time()
@@ -952,140 +1479,75 @@ def importUsabillaFromApi(campaignsArr):
 	if settings.DEBUG:
 		print(f'>> {campaignsArr}')
 	
-	for campaign in campaignsArr:
+	jobs = getUsabillaFetchJobs(campaignsArr)
+	
+	# Bounded so fetchers wait for the writer instead of piling up results in memory.
+	chunksQueue = queue.Queue(maxsize=max(workers, 1) * 2)
+	stopEvent = threading.Event()
+	threadData = threading.local()
+	jobsRemaining = len(jobs)
+	
+	with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+		for job in jobs:
+			executor.submit(fetchUsabillaJob, job, chunksQueue, stopEvent, clientFactory, threadData, chunkSize)
 		
-		# Get feedback responses.
-		if campaign['usabilla_button_id'] and campaign['usabilla_button_id'] not in campaignButtonsProcessed:
-			try:
-				# Get the earliest latest response date.
-				sinceDate = setSinceDate(campaign['latest_feedback_response_date'])
-				apiClient.set_query_parameters({'since': sinceDate})
-				campaignResponses = apiClient.get_resource(apiClient.SCOPE_LIVE, apiClient.PRODUCT_WEBSITES, apiClient.RESOURCE_FEEDBACK, campaign['usabilla_button_id'], iterate=True)
+		# If the writer fails, tell the fetchers to stop so the pool can shut down.
+		try:
+			while jobsRemaining > 0:
+				item = chunksQueue.get()
+				job = item['job']
 			
-				if settings.DEBUG:
-					print(f">> Button id: {campaign['usabilla_button_id']}, since date: {sinceDate}")
-				
-				for cr in campaignResponses:
-					processedCount += 1
-					
-					if settings.DEBUG:
-						print(f'>> Processing response #{processedCount}')
-					
-					if FeedbackResponse.objects.filter(uid=cr['id']).exists():
-						if settings.DEBUG:
-							print(f'>> Have it already')
-						continue
-					
-					# It's expecting object with some fields and survey data in 'data'
-					responseData = {
-						'id': cr['id'],
-						'date': cr['date'],
-						'campaignId': BUTTONS_ID_CAMPAIGNS_ID_MAP[campaign['usabilla_button_id']],
-						'data': cr,
-					}
-					
-					# Insert record if there's data.
-					responseDataArgs = convertFeedbackResponseToData(responseData)
-					if responseDataArgs:
-						try:
-							savedResponse = FeedbackResponse.objects.create(**responseDataArgs)
-							insertedCount += 1
-							buttonIdsTouched.append(campaign['usabilla_button_id'])
-							
-							if not savedResponse.campaign.usabilla_button_id:
-								savedResponse.campaign.usabilla_button_id = campaign['usabilla_button_id']
-								savedResponse.campaign.save()
-							if settings.DEBUG:
-								print(f'Inserted feedback #{insertedCount}')
-						except Exception as ex:
-							if settings.DEBUG:
-								print(f">> Error: Button id: {campaign['usabilla_button_id']}, since date: {sinceDate}")
-								print(f'Error importing response: {ex}')
-							continue
-						
-			except Exception as ex:
-				if settings.DEBUG:
-					print(f'{ex}')
-					
-				newActivity = ActivityLog.objects.create(
-					user = getUsabillaImportScriptUser(),
-					comments = f"Error trying Usabilla feedback button: {campaign['usabilla_button_id']}: {ex}"
-				)
-					
-			campaignButtonsProcessed.append(campaign['usabilla_button_id'])
+				if item.get('done'):
+					jobsRemaining -= 1
+					continue
 			
-		# Get VOTE responses.	
-		if campaign['uid'] and campaign['uid'] not in campaignsProcessed:
-			try:
-				# Get the earliest latest response date.
-				sinceDate = setSinceDate(campaign['latest_response_date'])
-				apiClient.set_query_parameters({'since': sinceDate})
-				campaignResponses = apiClient.get_resource(apiClient.SCOPE_LIVE, apiClient.PRODUCT_WEBSITES, apiClient.RESOURCE_CAMPAIGN_RESULT, campaign['uid'], iterate=True)
+				if item.get('error'):
+					if settings.DEBUG:
+						print(f"{item['error']}")
+				
+					if job['type'] == 'feedback':
+						comments = f"Error trying Usabilla feedback button: {job['id']}: {item['error']}"
+					else:
+						comments = f"Error trying Usabilla vote campaign: {job['id']}, using date: {item['error']}"
 				
+					newActivity = ActivityLog.objects.create(
+						user = getUsabillaImportScriptUser(),
+						comments = comments
+					)
+					continue
+			
+				processedCount += len(item['chunk'])
+			
 				if settings.DEBUG:
-					print(f">> Intercept id: {campaign['uid']}, since date: {sinceDate}")
+					print(f">> {job['type']} id: {job['id']}, processing responses up to #{processedCount}")
+			
+				try:
+					# Get feedback responses.
+					if job['type'] == 'feedback':
+						savedResponses = insertFeedbackResponsesChunk(item['chunk'], job['id'], chunkSize, cache)
+						if savedResponses:
+							insertedCount += len(savedResponses)
+							buttonIdsTouched.append(job['id'])
 				
-				# For each user response/feedback item, convert data and add to DB.
-				for cr in campaignResponses:
-					processedCount += 1
+					# Get VOTE responses.
+					else:
+						savedResponses = insertVoteResponsesChunk(item['chunk'], chunkSize, cache)
+						if savedResponses:
+							insertedCount += len(savedResponses)
+							campaignUidsTouched.append(job['id'])
 					
+						# Flag the project quarter/month of each response so we update those snapshots.
+						# Persisted right away, so the snapshots still get updated if this import dies.
+						SnapshotDirtyPeriod.markResponsesDirty(savedResponses)
+						ProjectDailyRollup.refreshDays(ProjectDailyRollup.getResponseDays(savedResponses))
+						for savedResponse in savedResponses:
+							trackProjectTouched(projectsTouched, projectsTouchedData, savedResponse.campaign.project_id, savedResponse.date)
+				except Exception as ex:
 					if settings.DEBUG:
-						print(f'>> Processing response #{processedCount}')
-					
-					if VoteResponse.objects.filter(uid=cr['id']).exists():
-						if settings.DEBUG:
-							print(f'>> Have it already')
-						continue
-					
-					# Insert record if there's data.
-					# No need to check if we have response already (via uid), just fail silently,
-					#   because 99.99% it's new response and if we have if just continue to next one anyway.
-					responseDataArgs = convertVoteResponseToData(cr)
-					if responseDataArgs:
-						try:
-							savedResponse = VoteResponse.objects.create(**responseDataArgs)	
-							insertedCount += 1
-							campaignUidsTouched.append(campaign['uid'])
-							if settings.DEBUG:
-								print(f'Inserted vote #{insertedCount}')
-						except Exception as ex:
-							if settings.DEBUG:
-								print(f">> Intercept id: {campaign['uid']}, since date: {sinceDate}")
-								print(f'{ex}')
-							continue
-						
-						# Flag this campaign so we set the latest response date for it (usabilla ID + role)
-						project = savedResponse.campaign.project
-						responseYearQuarter = (pd.Timestamp(savedResponse.date).year,pd.Timestamp(savedResponse.date).quarter)
-						responseYearMonth = (pd.Timestamp(savedResponse.date).year,pd.Timestamp(savedResponse.date).month)
-					
-						if project:
-							# If it's not in the array already, add it.
-							# Else, check if the month or quarter is there already and add that.
-							if project.id not in projectsTouched:
-								projectsTouched.append(project.id)
-								projectsTouchedData[project.id] = {
-									'quarters': [responseYearQuarter],
-									'months': [responseYearMonth],
-								}
-							else:
-								if responseYearQuarter not in projectsTouchedData[project.id]['quarters']:
-									projectsTouchedData[project.id]['quarters'].append(responseYearQuarter)
-								
-								if responseYearMonth not in projectsTouchedData[project.id]['months']:
-									projectsTouchedData[project.id]['months'].append(responseYearMonth)
-									
-			except Exception as ex:
-				if settings.DEBUG:
-					print(f'{ex}')
-				
-				newActivity = ActivityLog.objects.create(
-					user = getUsabillaImportScriptUser(),
-					comments = f"Error trying Usabilla vote campaign: {campaign['uid']}, using date: {ex}"
-				)
-				
-			campaignsProcessed.append(campaign['uid'])
-			
+						print(f">> Error: {job['type']} id: {job['id']}: {ex}")
+		finally:
+			stopEvent.set()
+	
 	newActivity = ActivityLog.objects.create(
 		user = getUsabillaImportScriptUser(),
 		comments = f'Import timer: Importing Usabilla responses: {round(time.time()-t0,1)}'
@@ -1100,10 +1562,10 @@ def importUsabillaFromApi(campaignsArr):
 	setCampaignsResponseCount()
 	
 	# We only need to update snapshots and baseline/targets for projects 
-	#  touched that got VOTE responses.
-	if len(projectsTouched) > 0:
-		updateProjectSnapshots(projectsTouched, projectsTouchedData)
-		updateDomainSnapshots(projectsTouched)
+	#  touched that got VOTE responses, or left in the snapshot queue by an earlier run.
+	if len(projectsTouched) > 0 or SnapshotDirtyPeriod.objects.exists():
+		projectsUpdated = updateProjectSnapshots(projectsTouched, projectsTouchedData)
+		updateDomainSnapshots(list(set(projectsTouched + projectsUpdated)))
 		setProjectYearBaselinesAndTargets()
 
 	# Cleanup and remove new Campaign placeholders we already fetched results for.
@@ -1122,23 +1584,127 @@ def importUsabillaFromApi(campaignsArr):
 	}
 	
 
-def importUsabillaFromCsv(file = './campaign-mark.csv'):
-	t0 = time.time()
+def readCsvRows(csvf):
+	"""
+	csv.reader that doesn't stop on a malformed line.
+	Return: {generator} Yields (line number, row, error) for each row.
+	"""
+	reader = csv.reader(csvf)
 	
-	with open(file,'r') as csvf:
-		rows = csv.reader(csvf)
-		totalRows = sum(1 for row in rows)
-
-	with open(file,'r') as csvf:
-		rows = csv.reader(csvf)
+	while True:
+		try:
+			row = next(reader)
+		except StopIteration:
+			return
+		except csv.Error as ex:
+			yield reader.line_num, None, str(ex)
+			continue
 		
-		for row in rows:
-			# Create the data object and insert response.
-			responseData = convertCsvToData(row)
-			if responseData:
-				VoteResponse.objects.create(**responseData)
+		yield reader.line_num, row, None
+
+
+def importUsabillaFromCsv(file = './campaign-mark.csv', chunkSize=USABILLA_IMPORT_CHUNK_SIZE, user=None):
+	"""
+	Stream a Usabilla CSV export (columns: see convertCsvToData) into VoteResponses.
+	The file is read once, chunkSize rows at a time, so memory stays flat for any file size.
+	Per chunk: one query for uids we already have, one insert per missing lookup table, one bulk insert.
+	Corrupt rows are skipped and reported instead of stopping the import.
+	Rows are loaded with bulk_create, not COPY: they need FK ids resolved in Python (dimension cache) and computed
+	  fields set, and bulk_create keeps ignore_conflicts and the ORM only data path the rest of the imports use.
+	Return: {obj} Import stats.
+	"""
+	t0 = time.time()
 	
-	#print(f'>> Finished importing {totalRows} rows, took {round(time.time()-t0,1)}.')
+	if not user:
+		user = getImportScriptUser()
+	
+	cache = ImportDimensionCache()
+	projectsTouched = []
+	projectsTouchedData = {}
+	rowCount = 0
+	insertedCount = 0
+	rejectedCount = 0
+	rejectedRows = []
+	
+	def rejectRow(lineNum, error):
+		# Keep the first 1000 so a totally wrong file doesn't fill memory.
+		if len(rejectedRows) < 1000:
+			rejectedRows.append({'line': lineNum, 'error': error})
+	
+	with open(file, 'r', newline='', encoding='utf-8', errors='replace') as csvf:
+		for chunk in chunkIterable(readCsvRows(csvf), chunkSize):
+			rowCount += len(chunk)
+			validRows = []
+			
+			for lineNum, row, error in chunk:
+				# Header row, if the export has one.
+				if lineNum == 1 and isCsvHeaderRow(row):
+					continue
+				
+				if not error:
+					error = validateCsvRow(row)
+				
+				if error:
+					rejectedCount += 1
+					rejectRow(lineNum, error)
+				else:
+					validRows.append((lineNum, row))
+			
+			existingUids = getExistingUids(VoteResponse, [row[2] for lineNum, row in validRows])
+			newRows = []
+			
+			for lineNum, row in validRows:
+				if row[2] in existingUids:
+					continue
+				existingUids.add(row[2])
+				newRows.append((lineNum, row))
+			
+			cache.createMissing(UserRole, [row[8] for lineNum, row in newRows])
+			cache.createMissing(PrimaryGoal, [row[9] for lineNum, row in newRows])
+			cache.createMissing(GoalCompleted, [row[11] for lineNum, row in newRows])
+			
+			responseDataArr = []
+			for lineNum, row in newRows:
+				try:
+					responseDataArr.append(convertCsvToData(row, cache))
+				except Exception as ex:
+					rejectedCount += 1
+					rejectRow(lineNum, str(ex))
+			
+			savedResponses = bulkCreateResponses(VoteResponse, responseDataArr, chunkSize)
+			insertedCount += len(savedResponses)
+			
+			SnapshotDirtyPeriod.markResponsesDirty(savedResponses)
+			ProjectDailyRollup.refreshDays(ProjectDailyRollup.getResponseDays(savedResponses))
+			for savedResponse in savedResponses:
+				trackProjectTouched(projectsTouched, projectsTouchedData, savedResponse.campaign.project_id, savedResponse.date)
+			
+			if settings.DEBUG:
+				print(f'>> CSV import: {rowCount} rows, {insertedCount} inserted, {rejectedCount} rejected, {round(rowCount/max(time.time()-t0, 0.001))} rows/s')
+	
+	runTime = time.time() - t0
+	rowsPerSecond = round(rowCount / max(runTime, 0.001))
+	
+	try:
+		newActivity = ActivityLog.objects.create(
+			user = user,
+			comments = f'Import timer: CSV import of {rowCount} rows ({insertedCount} inserted, {rejectedCount} rejected): {round(runTime,1)}s, {rowsPerSecond} rows/s'
+		)
+	except Exception as ex:
+		print(f'Error: Import timer: CSV import logging ERROR: {str(ex)}')
+	
+	if len(projectsTouched) > 0:
+		projectsUpdated = updateProjectSnapshots(projectsTouched, projectsTouchedData)
+		updateDomainSnapshots(list(set(projectsTouched + projectsUpdated)))
+	
+	return {
+		'processedCount': rowCount,
+		'insertedCount': insertedCount,
+		'rejectedCount': rejectedCount,
+		'rejectedRows': rejectedRows,
+		'rowsPerSecond': rowsPerSecond,
+		'projectsTouchedCount': len(projectsTouched),
+	}
 
 
 def createCsvFromUsabillaApi(campaignsArr):
@@ -1377,67 +1943,18 @@ def updateResponseFieldValues(dataObjects):
 			updatedCount += 1
 
 			# Get project and response year & quarter and track for updating project quarter snapshots and domain year snapshots.
-			project = r.campaign.project
-			responseYearQuarter = (pd.Timestamp(r.date).year,pd.Timestamp(r.date).quarter)
-			responseYearMonth = (pd.Timestamp(r.date).year,pd.Timestamp(r.date).month)
-			
-			if project:
-				# If it's not in the array already, add it.
-				# Else, check if the month or quarter is there already and add that.
-				if project.id not in projectsTouched:
-					projectsTouched.append(project.id)
-					projectsTouchedData[project.id] = {
-						'quarters': [responseYearQuarter],
-						'months': [responseYearMonth],
-					}
-				else:
-					if responseYearQuarter not in projectsTouchedData[project.id]['quarters']:
-						projectsTouchedData[project.id]['quarters'].append(responseYearQuarter)
-						
-					if responseYearMonth not in projectsTouchedData[project.id]['months']:
-						projectsTouchedData[project.id]['months'].append(responseYearMonth)
+			trackProjectTouched(projectsTouched, projectsTouchedData, r.campaign.project_id, r.date)
 
 		print(f">> After update found: {responses.filter(**{data['modelFieldName']+'__isnull': True}).count()}")
 
-	"""
-	Sample of what we store in projectsTouchedData as a result of the imports:
-	projectsTouched = [45,3,41,55]
-	projectsTouchedData = {
-		41 = {
-			quarters: [
-				(2019,2),
-				(2018,3)
-			],
-			momths: [
-				(2019,3),
-				(2018,7),
-			]
-		}
-	}
-	"""
+		# Queue the periods as we go so they still get updated if this dies on the next field.
+		SnapshotDirtyPeriod.markProjectsTouchedDirty(projectsTouchedData)
+
 	projectsTouched = cleanArray(projectsTouched)
 
-	# This only works when the campaign is associated to a project. 
-	# Update the quarterly and 'last 90 day' snapshots for each project we just added responses for.
-	for projectId in projectsTouched:
-		thisProject = Project.objects.get(id=projectId)
-		
-		for yearQuarter in projectsTouchedData[projectId]['quarters']:
-			thisProject.updateQuarterSnapshot(year=yearQuarter[0], quarter=yearQuarter[1])
-			
-		for yeaMonth in projectsTouchedData[projectId]['months']:
-			thisProject.updateMonthSnapshot(year=yearMonth[0], month=yearMonth[1])
-		
-		print(f">> Update project {thisProject.name} snapshot for Q: {projectsTouchedData[projectId]['quarters']}")
-		print(f">> Update project {thisProject.name} snapshot for M: {projectsTouchedData[projectId]['months']}")
-		
-	# Update the last 90 days snapshot for EVERY non-inactive project 
-	#  because it's a daily rolling time frame and responses drop off.
-	# Then update the stored snapshots (current reporting, valid, latest, etc)
-	t0 = time.time()
-	for project in Project.objects.allActive():
-		project.updateLast90Snapshot()
-		project.storeLatestSnapshots()
+	# Update the quarterly and monthly snapshots for each project/period we just changed responses for,
+	#  the last 90 days snapshot and stored snapshots for every active project.
+	projectsUpdated = updateProjectSnapshots(projectsTouched, projectsTouchedData)
 
 	# Set baseline and targets.
 	setProjectYearBaselinesAndTargets()
@@ -1445,9 +1962,8 @@ def updateResponseFieldValues(dataObjects):
 	# Update the DomainYearSnapshot for projects touched's domains.
 	# This will use updated snapshots, and updated year settings (if any) to calculate % active,
 	#  excellent NPS, etc. 
-	t0 = time.time()
-	for domain in Domain.objects.filter(project_domain__in=projectsTouched).distinct().order_by('name'):
-		domain.updateDomainYearSnapshot()
+	projectsTouched = list(set(projectsTouched + projectsUpdated))
+	updateDomainSnapshots(projectsTouched)
 
 	# Return stats.
 	print(json.dumps({
@@ -1465,11 +1981,19 @@ def setProjectYearBaselinesAndTargets():
 	We don't set baselines after July 15.
 	"""
 	if timezone.now() < timezone.make_aware(datetime(timezone.now().year,7,15)):
-		for project in Project.objects.allActive().filter(
+		t0 = time.time()
+		settingsUpdated = ProjectYearSetting.setAllBaselinesAndTargets(Project.objects.allActive().filter(
 			Q(project_year_setting_project__nps_baseline__isnull=True) | Q(project_year_setting_project__umux_baseline__isnull=True),
 			project_year_setting_project__year=timezone.now().year,
-		):
-			project.setYearBaselinesAndTargets()
+		))
+		
+		try:
+			newActivity = ActivityLog.objects.create(
+				user = getImportScriptUser(),
+				comments = f'Import timer: Set baselines and targets, {settingsUpdated} changed: {round(time.time()-t0,1)}s'
+			)
+		except Exception as ex:
+			print(f'Error: Import timer: Set baselines and targets logging ERROR: {str(ex)}')
 
 
 def setLatestResponseDate(campaignUidsTouched, user):
@@ -1537,7 +2061,7 @@ def setCampaignsResponseCount():
 		campaign.storeResponseCount()
 		
 
-def updateProjectSnapshots(projectsTouched, projectsTouchedData):
+def updateProjectSnapshots(projectsTouched=None, projectsTouchedData=None):
 	'''
 	Sample of what we store in projectsTouchedData as a result of the imports:
 	projectsTouched = [45,3,41,55]
@@ -1553,35 +2077,198 @@ def updateProjectSnapshots(projectsTouched, projectsTouchedData):
 			]
 		}
 	}
+	Periods are queued in SnapshotDirtyPeriod (no-op if the import already queued them), then
+	  everything in the queue is recalculated once, incl. periods left over from a run that died.
+	Return: {array} IDs of projects that had month/quarter snapshots recalculated.
 	'''
-	projectsTouched = cleanArray(projectsTouched)
+	if projectsTouchedData:
+		SnapshotDirtyPeriod.markProjectsTouchedDirty(projectsTouchedData)
 	
 	# This only works when the campaign is associated to a project. 
-	# Update the quarterly and 'last 90 day' snapshots for each project we just added responses for.
-	for projectId in projectsTouched:
-		thisProject = Project.objects.get(id=projectId)
-		
-		for yearQuarter in projectsTouchedData[projectId]['quarters']:
-			thisProject.updateQuarterSnapshot(year=yearQuarter[0], quarter=yearQuarter[1])
-		
-		for yearMonth in projectsTouchedData[projectId]['months']:
-			thisProject.updateMonthSnapshot(year=yearMonth[0], month=yearMonth[1])
+	# Update the quarterly and monthly snapshots for each project period we just added responses for.
+	t0 = time.time()
+	projectsUpdated = SnapshotDirtyPeriod.drain()
 	
-	# Update the last 90 days snapshot for EVERY non-inactive project 
-	#  because it's a daily rolling time frame and responses drop off.
-	# Then update the stored snapshots (current reporting, valid, latest, etc)
+	try:
+		newActivity = ActivityLog.objects.create(
+			user = getImportScriptUser(),
+			comments = f'Import timer: Update dirty snapshot periods for {len(projectsUpdated)} projects: {round(time.time()-t0,1)}s'
+		)
+	except Exception as ex:
+		print(f'Error: Import timer: Update dirty snapshot periods logging ERROR: {str(ex)}')
+	
+	# Update the last 90 days snapshot for non-inactive projects where it could have changed:
+	#  it's a daily rolling time frame, so responses drop off, but only projects with a response
+	#  crossing a window edge (or new/changed responses) need it recalculated.
+	# Projects we just recalculated periods for are always included (could be from deleted responses).
+	# Then update the stored snapshots (current reporting, valid, latest, etc) for all of them,
+	#  "currently reporting" depends on today's date.
 	t0 = time.time()
+	projectsNeedingLast90 = set(Project.getProjectsNeedingLast90Update(Project.objects.allActive()).values_list('id', flat=True))
+	projectsNeedingLast90.update(projectsUpdated)
+	updatedCount = 0
+	skippedCount = 0
+	updateTime = 0
+	
 	for project in Project.objects.allActive():
+		if project.id in projectsNeedingLast90:
+			t1 = time.time()
+			project.updateLast90Snapshot()
+			updateTime += time.time() - t1
+			updatedCount += 1
+		else:
+			skippedCount += 1
+	
+	Project.storeAllLatestSnapshots()
+	
+	# Estimate time saved using the average time it took for the ones we did update.
+	timeSaved = round(skippedCount * updateTime / updatedCount, 1) if updatedCount else 0
+	
+	try:
+		newActivity = ActivityLog.objects.create(
+			user = getImportScriptUser(),
+			comments = f'Import timer: Update last90 for {updatedCount} projects, skipped {skippedCount} unchanged (~{timeSaved}s saved): {round(time.time()-t0,1)}s'
+		)
+	except Exception as ex:
+		print(f'Error: Import timer: Update all last90 logging ERROR: {str(ex)}')
+	
+	return projectsUpdated
+	
+
+def reclassifyScores():
+	"""
+	After an admin changes NPS/UMUX/goal categories or targets: re-set the stored categories and targets
+	  on every snapshot and year setting with one set based UPDATE per table, then the domains that use them.
+	Return: {int} # of rows changed.
+	"""
+	t0 = time.time()
+	
+	# Rebuild the category/target lookups from the DB before using them.
+	ScoreIntervalIndex.invalidate()
+	
+	with transaction.atomic():
+		snapshotsChanged = ProjectSnapshot.reclassifyScoreCategories()
+		settingsChanged = ProjectYearSetting.reclassifyBaselinesAndTargets()
+	
+	Domain.updateDomainYearSnapshots()
+	
+	try:
+		newActivity = ActivityLog.objects.create(
+			user = getImportScriptUser(),
+			comments = f'Import timer: Reclassify scores, {snapshotsChanged} snapshots and {settingsChanged} year settings changed: {round(time.time()-t0,1)}s'
+		)
+	except Exception as ex:
+		print(f'Error: Import timer: Reclassify scores logging ERROR: {str(ex)}')
+	
+	return snapshotsChanged + settingsChanged
+	
+
+def updateDirtySnapshots():
+	'''
+	Recalculate whatever is in the snapshot queue (ex: after deleting responses), then the last 90 days
+	  and stored snapshots for those projects, and their domains.
+	Return: {array} IDs of projects updated.
+	'''
+	projectsUpdated = SnapshotDirtyPeriod.drain()
+	
+	for project in Project.objects.filter(id__in=projectsUpdated):
 		project.updateLast90Snapshot()
+	
+	Project.storeAllLatestSnapshots(Project.objects.filter(id__in=projectsUpdated))
+	
+	updateDomainSnapshots(projectsUpdated)
+	
+	return projectsUpdated
+	
+
+def closeDbConnections():
+	"""
+	Pool initializer: worker processes must not share the parent's DB connections, 
+	  so drop them and let Django open its own on first query.
+	"""
+	connections.close_all()
+
+
+def recalculateProjectSnapshots(projectId):
+	"""
+	Recalculate everything for one project: all month/quarter snapshots, last 90 days, 
+	  stored snapshots and this year's baselines and targets.
+	Top level function so it can be run in a worker process.
+	Errors are caught here so one bad project doesn't abort the rest of the run.
+	Return: {tuple} ID of the project, and the error message or None if it was updated.
+	"""
+	try:
+		project = Project.objects.get(id=projectId)
+		project.updateAllSnapshots()
 		project.storeLatestSnapshots()
+		project.setYearBaselinesAndTargets(year=timezone.now().year)
+	except Exception as ex:
+		# Connection may be left in a bad state, next query opens a new one.
+		connections.close_all()
+		return (projectId, f'{ex}')
+	
+	return (projectId, None)
+
+
+def recalculateAllSnapshots(projectIds=None, workers=1, progress=None):
+	"""
+	Full recalculation (ex: after a category change, bulk goal fix, or updateResponseFieldValues) of every 
+	  active project. Projects are independent, so with workers > 1 they're split across a process pool,
+	  each worker doing whole projects with its own DB connection. Domains depend on all their projects 
+	  so they're updated once at the end.
+	Only use workers > 1 from the recalculate_snapshots management command, never from a web worker 
+	  (forking the web process). The default runs serially in this process.
+	A project that fails is logged and skipped, the rest of the run carries on.
+	:param projectIds: Only recalculate these projects. Default is all active projects.
+	:param progress: Optional function called with (doneCount, totalCount, projectId, error) after each project.
+	Return: {array} IDs of projects updated.
+	"""
+	if projectIds is None:
+		projectIds = list(Project.objects.allActive().order_by('id').values_list('id', flat=True))
+	
+	t0 = time.time()
+	projectsUpdated = []
+	projectsFailed = []
+	
+	def trackProgress(result):
+		projectId, error = result
+		if error:
+			projectsFailed.append(projectId)
+			try:
+				newActivity = ActivityLog.objects.create(
+					user = getImportScriptUser(),
+					comments = f'Error recalculating snapshots for project {projectId}: {error}'
+				)
+			except Exception as ex:
+				print(f'Error: Recalculate snapshots logging ERROR: {str(ex)}')
+		else:
+			projectsUpdated.append(projectId)
+			
+		if progress:
+			progress(len(projectsUpdated)+len(projectsFailed), len(projectIds), projectId, error)
+	
+	if workers > 1 and len(projectIds) > 1:
+		# Don't let the forked workers inherit open connections.
+		connections.close_all()
+		with multiprocessing.Pool(processes=min(workers, len(projectIds)), initializer=closeDbConnections) as pool:
+			for result in pool.imap_unordered(recalculateProjectSnapshots, projectIds):
+				trackProgress(result)
+	else:
+		for projectId in projectIds:
+			trackProgress(recalculateProjectSnapshots(projectId))
 	
 	try:
 		newActivity = ActivityLog.objects.create(
 			user = getImportScriptUser(),
-			comments = f'Import timer: Update all last90: {round(time.time()-t0,1)}s'
+			comments = f'Import timer: Recalculate all snapshots for {len(projectsUpdated)} projects, {len(projectsFailed)} failed ({workers} workers): {round(time.time()-t0,1)}s'
 		)
 	except Exception as ex:
-		print(f'Error: Import timer: Update all last90 logging ERROR: {str(ex)}')
+		print(f'Error: Import timer: Recalculate all snapshots logging ERROR: {str(ex)}')
+	
+	# Failed projects may be partly updated, so their domains are refreshed too.
+	updateDomainSnapshots(projectIds)
+	
+	return projectsUpdated
 	
 
 def updateDomainSnapshots(projectsTouched):
@@ -1589,13 +2276,13 @@ def updateDomainSnapshots(projectsTouched):
 	# This will use updated snapshots, and updated year settings (if any) to calculate % active,
 	#  excellent NPS, etc. 
 	t0 = time.time()
-	for domain in Domain.objects.filter(project_domain__in=projectsTouched).distinct().order_by('name'):
-		domain.updateDomainYearSnapshot()
+	domainIds = list(Domain.objects.filter(project_domain__in=projectsTouched).order_by().values_list('id', flat=True).distinct())
+	domainsCount = Domain.updateDomainYearSnapshots(domainIds=domainIds)
 	
 	try:
 		newActivity = ActivityLog.objects.create(
 			user = getImportScriptUser(),
-			comments = f'Import timer: Update touched domains ({Domain.objects.filter(project_domain__in=projectsTouched).distinct().count()}): {round(time.time()-t0,1)}s'
+			comments = f'Import timer: Update touched domains ({domainsCount}): {round(time.time()-t0,1)}s'
 		)
 	except Exception as ex:
 		print(f'Error: Import timer: Update touched domains logging ERROR: {str(ex)}')
@@ -1,3 +1,676 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import urllib.parse
 
-# Create your tests here.
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from metrics.models import *
+import metrics.helpers as helpers
+import metrics.response_data_helpers as responseDataHelpers
+
+
+def createTestUser():
+	user, created = User.objects.get_or_create(username='test_user')
+	return user
+
+
+def createTestCategories(user=None):
+	'''
+	The NPS/UMUX/Goal categories the snapshot calculations classify scores into, and the data sources they store.
+	'''
+	user = user or createTestUser()
+	
+	for name in ['Usabilla', 'Other']:
+		DataSource.objects.get_or_create(name=name, defaults={'created_by': user, 'updated_by': user})
+	for name, minScore, maxScore in [('Poor', -100, 0), ('Good', 0.1, 30), ('Very good', 30.1, 50), ('Excellent', 50.1, 100)]:
+		NpsScoreCategory.objects.get_or_create(name=name, defaults={'min_score_range': minScore, 'max_score_range': maxScore, 'created_by': user, 'updated_by': user})
+	for name, minScore, maxScore in [('Poor', 0, 50), ('Good', 50.1, 75), ('Excellent', 75.1, 100)]:
+		UmuxScoreCategory.objects.get_or_create(name=name, defaults={'min_score_range': minScore, 'max_score_range': maxScore, 'color_code': 'red', 'created_by': user, 'updated_by': user})
+	for name, minScore, maxScore in [('Poor', 0, 50), ('Good', 50.1, 75), ('Excellent', 75.1, 100)]:
+		GoalCompletedCategory.objects.get_or_create(name=name, defaults={'min_score_range': minScore, 'max_score_range': maxScore, 'color_code': 'red', 'created_by': user, 'updated_by': user})
+	
+	ScoreIntervalIndex.invalidate()
+
+
+def createTestProject(name, domain=None, responsesCount=40, daysBack=200, npsOffset=0, user=None):
+	'''
+	Project with one vote campaign and responses spread over the last `daysBack` days.
+	Return: {obj} The project.
+	'''
+	user = user or createTestUser()
+	project = Project.objects.create(name=name, domain=domain, core_project=True, created_by=user, updated_by=user)
+	campaign = Campaign.objects.create(project=project, uid=f'{name}-uid', key=f'{name}-key', created_by=user, updated_by=user)
+	goalCompleted, created = GoalCompleted.objects.get_or_create(name='Yes')
+	now = timezone.now()
+	
+	for i in range(responsesCount):
+		VoteResponse.objects.create(
+			campaign=campaign,
+			uid=f'{name}-{i}',
+			date=now - timedelta(days=(i * daysBack) // responsesCount, hours=i % 24),
+			nps=(i + npsOffset) % 11,
+			umux_capability=(i % 7) + 1,
+			umux_ease_of_use=((i + 3) % 7) + 1,
+			goal_completed=goalCompleted if i % 3 else None,
+			raw_data={},
+		)
+	
+	return project
+
+
+def getSnapshotValues(projectIds):
+	'''
+	Snapshot field values to compare two calculation runs, without row ids and timestamps.
+	Return: {array} Snapshot values dicts, in a stable order.
+	'''
+	excludeFields = ['id', 'created_at', 'updated_at', 'created_by', 'updated_by']
+	fields = [field.attname for field in ProjectSnapshot._meta.concrete_fields if field.name not in excludeFields]
+	
+	return list(ProjectSnapshot.objects.filter(project__in=projectIds).order_by('project_id', 'date_period', 'date').values(*fields))
+
+
+class UsabillaStubServer:
+	'''
+	Local stand-in for the Usabilla API, serving campaign results in 2 pages per campaign.
+	Campaign ids starting with "flaky" get a 429 on their first request, "down" always get a 429.
+	Every request waits `delay` seconds, like a slow API would, and the most requests
+	  in flight at the same time is recorded.
+	'''
+	def __init__(self, delay=0.05, itemsPerPage=3):
+		self.delay = delay
+		self.itemsPerPage = itemsPerPage
+		self.lock = threading.Lock()
+		self.requestCounts = {}
+		self.inFlight = 0
+		self.maxInFlight = 0
+
+		stub = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				stub.handle(self)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		self.host = f'127.0.0.1:{self.server.server_address[1]}'
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def handle(self, request):
+		url = urllib.parse.urlparse(request.path)
+		# /live/websites/campaign/<id>/results
+		campaignId = url.path.split('/')[-2]
+		since = int(urllib.parse.parse_qs(url.query).get('since', ['0'])[0])
+
+		with self.lock:
+			self.requestCounts[campaignId] = self.requestCounts.get(campaignId, 0) + 1
+			requestCount = self.requestCounts[campaignId]
+			self.inFlight += 1
+			self.maxInFlight = max(self.maxInFlight, self.inFlight)
+
+		try:
+			time.sleep(self.delay)
+
+			if campaignId.startswith('down') or (campaignId.startswith('flaky') and requestCount == 1):
+				request.send_response(429)
+				request.send_header('Retry-After', '0')
+				request.end_headers()
+				return
+
+			# First page is asked for with the real since date (ms), the second with lastTimestamp of the first.
+			page = 2 if since == 1 else 1
+			body = json.dumps({
+				'items': [{'id': f'{campaignId}-{page}-{i}'} for i in range(self.itemsPerPage)],
+				'hasMore': page == 1,
+				'lastTimestamp': 1,
+			}).encode('utf8')
+
+			request.send_response(200)
+			request.send_header('Content-Type', 'application/json')
+			request.send_header('Content-Length', str(len(body)))
+			request.end_headers()
+			request.wfile.write(body)
+		finally:
+			with self.lock:
+				self.inFlight -= 1
+
+
+class UsabillaConcurrentFetchTests(SimpleTestCase):
+	'''
+	Threaded Usabilla fetch (importUsabillaFromApi workers) against a local stub API.
+	Doesn't touch the DB, only the fetch side that hands chunks to the writer.
+	'''
+	def setUp(self):
+		self.stub = UsabillaStubServer().start()
+		self.settings = override_settings(
+			USABILLA_ACCESS_KEY='key',
+			USABILLA_SECRET_KEY='secret',
+			USABILLA_API_HOST=self.stub.host,
+			USABILLA_API_PROTOCOL='http://',
+		)
+		self.settings.enable()
+
+	def tearDown(self):
+		self.settings.disable()
+		self.stub.stop()
+
+	def getJob(self, campaignId):
+		return {
+			'type': 'vote',
+			'id': campaignId,
+			'resource': responseDataHelpers.ub.APIClient.RESOURCE_CAMPAIGN_RESULT,
+			'sinceDate': None,
+		}
+
+	def fetchJobs(self, jobs, workers):
+		'''
+		Run the jobs the same way importUsabillaFromApi does, and collect what the writer would get.
+		Return: {obj} Item ids by job id, and job ids that reported an error.
+		'''
+		chunksQueue = queue.Queue(maxsize=max(workers, 1) * 2)
+		stopEvent = threading.Event()
+		threadData = threading.local()
+		jobsRemaining = len(jobs)
+		itemIds = {job['id']: [] for job in jobs}
+		errors = []
+
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			for job in jobs:
+				executor.submit(responseDataHelpers.fetchUsabillaJob, job, chunksQueue, stopEvent, responseDataHelpers.createUsabillaClient, threadData, 2)
+
+			while jobsRemaining > 0:
+				item = chunksQueue.get(timeout=10)
+				if item.get('done'):
+					jobsRemaining -= 1
+				elif item.get('error'):
+					errors.append(item['job']['id'])
+				else:
+					itemIds[item['job']['id']] += [cr['id'] for cr in item['chunk']]
+
+		return {'itemIds': itemIds, 'errors': errors}
+
+	def test_rate_limited_page_is_retried(self):
+		apiClient = responseDataHelpers.createUsabillaClient()
+
+		items = list(responseDataHelpers.fetchUsabillaResults(apiClient, apiClient.RESOURCE_CAMPAIGN_RESULT, 'flaky1', responseDataHelpers.setSinceDate()))
+
+		self.assertEqual([item['id'] for item in items], ['flaky1-1-0', 'flaky1-1-1', 'flaky1-1-2', 'flaky1-2-0', 'flaky1-2-1', 'flaky1-2-2'])
+		# 1 rate limited + 2 pages.
+		self.assertEqual(self.stub.requestCounts['flaky1'], 3)
+
+	def test_retries_give_up_after_max_retries(self):
+		apiClient = responseDataHelpers.createUsabillaClient()
+
+		with self.assertRaises(requests.exceptions.HTTPError):
+			list(responseDataHelpers.fetchUsabillaResults(apiClient, apiClient.RESOURCE_CAMPAIGN_RESULT, 'down1', responseDataHelpers.setSinceDate(), maxRetries=2))
+
+		self.assertEqual(self.stub.requestCounts['down1'], 3)
+
+	def test_concurrent_fetch_gets_every_item(self):
+		jobs = [self.getJob(campaignId) for campaignId in ['c1', 'c2', 'flaky1', 'down1']]
+
+		results = self.fetchJobs(jobs, workers=4)
+
+		for campaignId in ['c1', 'c2', 'flaky1']:
+			self.assertEqual(sorted(results['itemIds'][campaignId]), sorted([f'{campaignId}-{page}-{i}' for page in [1, 2] for i in range(3)]))
+		# A campaign that keeps failing is reported to the writer, and doesn't stop the others.
+		self.assertEqual(results['errors'], ['down1'])
+		self.assertGreater(self.stub.maxInFlight, 1)
+
+	def test_workers_overlap_requests_and_match_serial_fetch(self):
+		'''
+		Same items as fetching one campaign at a time, with requests to the API in flight at the same time.
+		Checked on the stub's request overlap rather than wall clock time, so it doesn't depend on machine load.
+		'''
+		jobs = [self.getJob(f'c{i}') for i in range(8)]
+
+		serialResults = self.fetchJobs(jobs, workers=1)
+		self.assertEqual(self.stub.maxInFlight, 1)
+
+		self.stub.maxInFlight = 0
+		concurrentResults = self.fetchJobs(jobs, workers=4)
+
+		self.assertEqual({k: sorted(v) for k, v in serialResults['itemIds'].items()}, {k: sorted(v) for k, v in concurrentResults['itemIds'].items()})
+		self.assertGreater(self.stub.maxInFlight, 1)
+
+
+class RecalculateAllSnapshotsTests(TransactionTestCase):
+	'''
+	Full snapshot recalculation, serial and across a process pool.
+	TransactionTestCase so the forked workers can see the committed test data.
+	'''
+	def setUp(self):
+		createTestCategories()
+		domain = Domain.objects.create(name='Test domain', created_by=createTestUser(), updated_by=createTestUser())
+		self.projectIds = [createTestProject(f'Project {i}', domain=domain, npsOffset=i).id for i in range(3)]
+
+	def test_parallel_matches_serial(self):
+		serialUpdated = responseDataHelpers.recalculateAllSnapshots(projectIds=self.projectIds, workers=1)
+		serialSnapshots = getSnapshotValues(self.projectIds)
+		
+		ProjectSnapshot.objects.filter(project__in=self.projectIds).delete()
+		
+		parallelUpdated = responseDataHelpers.recalculateAllSnapshots(projectIds=self.projectIds, workers=2)
+		parallelSnapshots = getSnapshotValues(self.projectIds)
+		
+		self.assertEqual(sorted(serialUpdated), sorted(self.projectIds))
+		self.assertEqual(sorted(parallelUpdated), sorted(self.projectIds))
+		self.assertTrue(serialSnapshots)
+		self.assertEqual(serialSnapshots, parallelSnapshots)
+
+	def test_failing_project_doesnt_stop_the_run(self):
+		failingProjectId = self.projectIds[1]
+		updateAllSnapshots = Project.updateAllSnapshots
+		
+		def failOne(project):
+			if project.id == failingProjectId:
+				raise ValueError('Bad project')
+			return updateAllSnapshots(project)
+		
+		progressErrors = {}
+		with mock.patch.object(Project, 'updateAllSnapshots', failOne):
+			projectsUpdated = responseDataHelpers.recalculateAllSnapshots(
+				projectIds=self.projectIds, 
+				workers=1, 
+				progress=lambda doneCount, totalCount, projectId, error: progressErrors.update({projectId: error})
+			)
+		
+		self.assertEqual(sorted(projectsUpdated), sorted([self.projectIds[0], self.projectIds[2]]))
+		self.assertEqual(progressErrors[failingProjectId], 'Bad project')
+		self.assertTrue(ActivityLog.objects.filter(comments__contains=f'Error recalculating snapshots for project {failingProjectId}').exists())
+		# Domains still get updated at the end.
+		self.assertTrue(DomainYearSnapshot.objects.filter(domain__name='Test domain').exists())
+
+
+class ConcurrentSnapshotWritersTests(TransactionTestCase):
+	'''
+	Several workers writing one project's snapshots at the same time (queue drains on two nodes, 
+	  a full recalculation, get or create) must not duplicate or lose snapshots.
+	TransactionTestCase so each thread's own connection sees the committed test data.
+	'''
+	def setUp(self):
+		createTestCategories()
+		self.project = createTestProject('Concurrent project', responsesCount=60, daysBack=300)
+
+	def runConcurrently(self, functs):
+		'''
+		Start all functions at the same moment, each on its own thread (and DB connection).
+		Return: {array} Exceptions raised, if any.
+		'''
+		barrier = threading.Barrier(len(functs))
+		errors = []
+		
+		def run(funct):
+			try:
+				barrier.wait()
+				funct()
+			except Exception as ex:
+				errors.append(ex)
+			finally:
+				connection.close()
+		
+		threads = [threading.Thread(target=run, args=(funct,)) for funct in functs]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		
+		return errors
+
+	def assertNoDuplicateSnapshots(self):
+		periods = [(snapshot.date_period, snapshot.date.year, snapshot.date_quarter if snapshot.date_period == 'quarter' else snapshot.date.month) for snapshot in ProjectSnapshot.objects.filter(project=self.project).exclude(date_period='last90')]
+		self.assertEqual(len(periods), len(set(periods)))
+		self.assertLessEqual(ProjectSnapshot.objects.filter(project=self.project, date_period='last90').count(), 1)
+
+	def test_racing_get_or_create_makes_one_snapshot(self):
+		now = timezone.now()
+		errors = self.runConcurrently([lambda: Project.objects.get(id=self.project.id).getCreateSnapshot(create=True, year=now.year, month=now.month)] * 4)
+		
+		self.assertEqual(errors, [])
+		self.assertEqual(ProjectSnapshot.objects.filter(project=self.project, date_period='month', date__year=now.year, date__month=now.month).count(), 1)
+
+	def test_two_drains_and_full_recalculation_at_once(self):
+		ProjectSnapshot.objects.filter(project=self.project).delete()
+		SnapshotDirtyPeriod.markResponsesDirty(VoteResponse.objects.filter(campaign__project=self.project))
+		
+		errors = self.runConcurrently([
+			lambda: SnapshotDirtyPeriod.drain(workerId='worker-1'),
+			lambda: SnapshotDirtyPeriod.drain(workerId='worker-2'),
+			lambda: Project.objects.get(id=self.project.id).updateAllSnapshots(),
+		])
+		
+		self.assertEqual(errors, [])
+		self.assertFalse(SnapshotDirtyPeriod.objects.exists())
+		self.assertNoDuplicateSnapshots()
+		
+		# Same values as one writer on its own.
+		concurrentSnapshots = [snapshot for snapshot in getSnapshotValues([self.project.id]) if snapshot['date_period'] != 'last90']
+		self.project.updateAllSnapshots()
+		serialSnapshots = [snapshot for snapshot in getSnapshotValues([self.project.id]) if snapshot['date_period'] != 'last90']
+		
+		self.assertEqual(concurrentSnapshots, serialSnapshots)
+
+
+class SnapshotDirtyPeriodTests(TestCase):
+	'''
+	Queueing periods with the raw upsert against the migrated table.
+	'''
+	def setUp(self):
+		createTestCategories()
+		self.project = createTestProject('Dirty project', responsesCount=10, daysBack=60)
+
+	def test_mark_dirty_queues_unleased_periods(self):
+		SnapshotDirtyPeriod.markDirty([(self.project.id, 'month', 2026, 1), (self.project.id, 'quarter', 2026, 1)])
+		SnapshotDirtyPeriod.markDirty([(self.project.id, 'month', 2026, 1)])
+		
+		self.assertEqual(SnapshotDirtyPeriod.objects.count(), 2)
+		self.assertFalse(SnapshotDirtyPeriod.objects.exclude(leased_by='').exists())
+
+	def test_mark_responses_dirty(self):
+		responses = VoteResponse.objects.filter(campaign__project=self.project)
+		SnapshotDirtyPeriod.markResponsesDirty(responses)
+		
+		self.assertEqual(
+			set(SnapshotDirtyPeriod.objects.filter(period_type='month').values_list('year', 'period')),
+			set([(timezone.localtime(response.date).year, timezone.localtime(response.date).month) for response in responses])
+		)
+
+
+class CsvImportTests(TestCase):
+	'''
+	Usabilla CSV export import: header skipped, rows inserted in bulk and queued for snapshot recalculation.
+	'''
+	def setUp(self):
+		createTestCategories()
+		self.project = createTestProject('CSV project', responsesCount=0)
+
+	def importRows(self, rows):
+		with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as csvFile:
+			csv.writer(csvFile).writerows(rows)
+		self.addCleanup(os.remove, csvFile.name)
+		
+		return responseDataHelpers.importUsabillaFromCsv(csvFile.name)
+
+	def getRow(self, uid, date):
+		return ['CSV project-key', 'CSV project-uid', uid, date, '9', '6', '5', '', 'Developer', 'Learn', '', 'Yes', '', '', 'No', 'https://example.com']
+
+	def test_slightly_different_header_is_skipped(self):
+		header = ['campaign', 'Campaign Id', 'Response Id', 'Date ', 'NPS score'] + responseDataHelpers.CSV_IMPORT_COLUMNS[5:16]
+		
+		stats = self.importRows([header, self.getRow('csv-1', '2026-01-15T10:00:00'), self.getRow('csv-2', '2026-02-15T10:00:00')])
+		
+		self.assertEqual(stats['insertedCount'], 2)
+		self.assertEqual(stats['rejectedCount'], 0)
+		self.assertEqual(VoteResponse.objects.filter(campaign__project=self.project).count(), 2)
+
+	def test_bad_rows_are_rejected_and_the_rest_imported(self):
+		stats = self.importRows([self.getRow('csv-1', 'not a date'), self.getRow('csv-2', '2026-02-15T10:00:00'), ['too', 'short']])
+		
+		self.assertEqual(stats['insertedCount'], 1)
+		self.assertEqual([row['line'] for row in stats['rejectedRows']], [1, 3])
+
+
+class GoalCompletedCategoryTests(TestCase):
+	'''
+	Goal completion % only stored with a category, same as before the in-memory index.
+	'''
+	def setUp(self):
+		user = createTestUser()
+		GoalCompletedCategory.objects.create(name='Good', min_score_range=50, max_score_range=100, color_code='green', created_by=user, updated_by=user)
+		ScoreIntervalIndex.invalidate()
+
+	def getStats(self, yesCount, count):
+		stats = {key: None for key in ProjectSnapshot.getResponseStatsAggregates().keys()}
+		stats.update({
+			'response_count': count,
+			'meaningful_response_count': count,
+			'nps_count': 0,
+			'umux_count': 0,
+			'goal_completed_count': count,
+			'goal_completed_yes_count': yesCount,
+		})
+		return stats
+
+	def test_no_matching_category_clears_percent(self):
+		snapshot = ProjectSnapshot()
+		snapshot.calculateStats(None, self.getStats(yesCount=1, count=4))
+		
+		self.assertIsNone(snapshot.goal_completed_category)
+		self.assertIsNone(snapshot.goal_completed_percent)
+
+	def test_matching_category_keeps_percent(self):
+		snapshot = ProjectSnapshot()
+		snapshot.calculateStats(None, self.getStats(yesCount=3, count=4))
+		
+		self.assertEqual(snapshot.goal_completed_category.name, 'Good')
+		self.assertEqual(snapshot.goal_completed_percent, 75)
+
+
+class ProjectDailyRollupTests(TestCase):
+	'''
+	Rollups refreshed for just the touched days match a full rebuild.
+	'''
+	def setUp(self):
+		createTestCategories()
+		self.project = createTestProject('Rollup project', responsesCount=30, daysBack=60)
+		ProjectDailyRollup.refresh([self.project.id])
+
+	def getRollupValues(self):
+		return list(ProjectDailyRollup.objects.filter(project=self.project).order_by('day').values(*[field.name for field in ProjectDailyRollup._meta.fields if field.name not in ('id', 'updated_at')]))
+
+	def test_merge_day_ranges(self):
+		day = timezone.localdate()
+		dayRanges = [(day, day + timedelta(days=5)), (day - timedelta(days=3), day + timedelta(days=1)), (day + timedelta(days=6), day + timedelta(days=6)), (day + timedelta(days=9), day + timedelta(days=9))]
+		
+		self.assertEqual(ProjectDailyRollup.mergeDayRanges(dayRanges), [(day - timedelta(days=3), day + timedelta(days=6)), (day + timedelta(days=9), day + timedelta(days=9))])
+
+	def test_refresh_days_after_delete_matches_full_refresh(self):
+		responses = VoteResponse.objects.filter(campaign__project=self.project, uid__in=['Rollup project-3', 'Rollup project-4', 'Rollup project-20'])
+		responseDays = ProjectDailyRollup.getResponseDays(responses)
+		responses.delete()
+		ProjectDailyRollup.refreshDays(responseDays)
+		partialRollups = self.getRollupValues()
+		
+		ProjectDailyRollup.refresh([self.project.id])
+		
+		self.assertEqual(partialRollups, self.getRollupValues())
+
+
+class TimeMachineReportTests(TestCase):
+	'''
+	Stored reports are reused until the rollups or categories change, and recalculated in place.
+	'''
+	def setUp(self):
+		createTestCategories()
+		self.project = createTestProject('Time machine project', responsesCount=30, daysBack=60)
+		ProjectDailyRollup.refresh([self.project.id])
+		self.projects = Project.objects.filter(id=self.project.id)
+		self.endDate = timezone.now()
+
+	def test_report_is_reused(self):
+		report = TimeMachineReport.getOrGenerate(self.endDate, projects=self.projects)
+		
+		self.assertEqual(TimeMachineReport.getOrGenerate(self.endDate, projects=self.projects).created_at, report.created_at)
+
+	def test_deleted_responses_update_the_report(self):
+		report = TimeMachineReport.getOrGenerate(self.endDate, projects=self.projects)
+		
+		responses = VoteResponse.objects.filter(campaign__project=self.project, uid='Time machine project-0')
+		responseDays = ProjectDailyRollup.getResponseDays(responses)
+		responses.delete()
+		ProjectDailyRollup.refreshDays(responseDays)
+		
+		newReport = TimeMachineReport.getOrGenerate(self.endDate, projects=self.projects)
+		
+		self.assertEqual(newReport.id, report.id)
+		self.assertEqual(newReport.results[0]['meaningful_response_count'], str(int(report.results[0]['meaningful_response_count']) - 1))
+		self.assertEqual(TimeMachineReport.objects.count(), 1)
+
+	def test_category_change_updates_the_report(self):
+		report = TimeMachineReport.getOrGenerate(self.endDate, projects=self.projects)
+		
+		NpsScoreCategory.objects.filter(name='Poor').update(max_score_range=-50)
+		NpsScoreCategory.objects.get(name='Good').save()
+		
+		self.assertGreater(TimeMachineReport.getOrGenerate(self.endDate, projects=self.projects).created_at, report.created_at)
+		# One global change stamp, the projects aren't rewritten.
+		self.assertFalse(Project.objects.filter(time_machine_changed_at__gt=report.created_at).exists())
+
+
+class StoreAllLatestSnapshotsTests(TestCase):
+	'''
+	The set based storeAllLatestSnapshots picks the same 4 snapshots as storeLatestSnapshots per project.
+	'''
+	fields = ['latest_valid_snapshot_id', 'latest_snapshot_by_date_id', 'currently_reporting_snapshot_id', 'latest_valid_currently_reporting_snapshot_id']
+
+	def setUp(self):
+		createTestCategories()
+		
+		self.projects = [createTestProject(f'Latest project {i}', responsesCount=60, daysBack=400, npsOffset=i) for i in range(4)]
+		for project in self.projects:
+			project.updateAllSnapshots()
+		
+		# No last90, falls back to the latest quarter.
+		ProjectSnapshot.objects.filter(project=self.projects[1], date_period='last90').delete()
+		
+		# No last90, latest quarter not meaningful and an older one not currently reporting.
+		ProjectSnapshot.objects.filter(project=self.projects[2], date_period='last90').delete()
+		quarters = list(ProjectSnapshot.objects.filter(project=self.projects[2], date_period='quarter').order_by('-date'))
+		ProjectSnapshot.objects.filter(id=quarters[0].id).update(nps_meaningful_data=False)
+		ProjectSnapshot.objects.filter(id=quarters[1].id).update(nps_score_date=timezone.now() - timedelta(days=365))
+		
+		# No snapshots at all.
+		ProjectSnapshot.objects.filter(project=self.projects[3]).delete()
+
+	def getStoredIds(self):
+		return list(Project.objects.filter(id__in=[project.id for project in self.projects]).order_by('id').values_list(*self.fields))
+
+	def test_matches_per_project_store(self):
+		for project in Project.objects.filter(id__in=[project.id for project in self.projects]):
+			project.storeLatestSnapshots()
+		perProjectIds = self.getStoredIds()
+		
+		Project.objects.update(**{field: None for field in self.fields})
+		Project.storeAllLatestSnapshots(Project.objects.filter(id__in=[project.id for project in self.projects]))
+		
+		self.assertEqual(self.getStoredIds(), perProjectIds)
+		self.assertEqual(Project.storeAllLatestSnapshots(Project.objects.filter(id__in=[project.id for project in self.projects])), 0)
+
+
+class ScoreRoundingTests(TestCase):
+	'''
+	Categories matched in Python (calculateStats) and in SQL (reclassifyScores) round boundary scores the same way.
+	'''
+	boundaryScores = [
+		(NpsScoreCategory, 1, [-29.95, -0.05, 0.05, 0.1, 29.95, 30.05, 30.15, 50.05, 50.15, 29.949999999999996, 0.1 + 0.2]),
+		(UmuxScoreCategory, 1, [49.95, 50.05, 50.15, 74.95, 75.05, 75.15]),
+		(GoalCompletedCategory, 0, [49.5, 50.5, 62.5, 74.5, 75.5, 75.49999]),
+	]
+
+	def setUp(self):
+		createTestCategories()
+
+	def test_round_score_rounds_halves_away_from_zero(self):
+		self.assertEqual(ScoreIntervalIndex.roundScore(62.5, 0), 63)
+		self.assertEqual(ScoreIntervalIndex.roundScore(29.95, 1), 30)
+		self.assertEqual(ScoreIntervalIndex.roundScore(-29.95, 1), -30)
+
+	def test_python_and_sql_rounding_match(self):
+		with connection.cursor() as cursor:
+			for model, places, scores in self.boundaryScores:
+				for score in scores:
+					cursor.execute(f"SELECT {ScoreIntervalIndex.getRoundSql('%s::double precision', places)}", [score])
+					self.assertEqual(float(cursor.fetchone()[0]), ScoreIntervalIndex.roundScore(score, places), score)
+
+	def test_python_and_sql_categories_match(self):
+		with connection.cursor() as cursor:
+			for model, places, scores in self.boundaryScores:
+				sql, params = ScoreIntervalIndex.getRangeMatchSql(model, ScoreIntervalIndex.getRoundSql('score', places))
+				for score in scores:
+					cursor.execute(f'SELECT {sql} FROM (SELECT %s::double precision AS score) scores', params + [score])
+					category = ScoreIntervalIndex.getRangeMatch(model, ScoreIntervalIndex.roundScore(score, places))
+					self.assertEqual(cursor.fetchone()[0], category.id if category else None, score)
+
+
+class RolloverYearTests(TestCase):
+	'''
+	Start of year rollover keeps manually entered baselines, and an early run for next year sets no baselines.
+	'''
+	def setUp(self):
+		createTestCategories()
+		self.user = createTestUser()
+		self.year = timezone.now().year
+		
+		self.manualProject = createTestProject('Manual baseline project', responsesCount=150, daysBack=90, user=self.user)
+		self.automaticProject = createTestProject('Automatic baseline project', responsesCount=150, daysBack=90, npsOffset=3, user=self.user)
+		for project in [self.manualProject, self.automaticProject]:
+			project.updateAllSnapshots()
+		
+		ProjectYearSetting.objects.create(project=self.manualProject, year=self.year-1, created_by=self.user, updated_by=self.user, nps_baseline=12.3, nps_baseline_entry_type='manual')
+
+	def test_manual_baseline_is_kept(self):
+		ProjectYearSetting.rolloverYear(self.year)
+		
+		manualSetting = ProjectYearSetting.objects.get(project=self.manualProject, year=self.year)
+		self.assertEqual(manualSetting.nps_baseline, 12.3)
+		self.assertEqual(manualSetting.nps_baseline_entry_type, 'manual')
+		self.assertFalse(ActivityLog.objects.filter(object_id=manualSetting.id, comments__startswith='NPS baseline changed').exists())
+		
+		automaticSetting = ProjectYearSetting.objects.get(project=self.automaticProject, year=self.year)
+		self.assertEqual(automaticSetting.nps_baseline_entry_type, 'automatic')
+
+	def test_early_run_sets_no_baselines(self):
+		ProjectYearSetting.objects.create(project=self.manualProject, year=self.year, created_by=self.user, updated_by=self.user, nps_baseline=12.3, nps_baseline_entry_type='manual')
+		
+		ProjectYearSetting.rolloverYear(self.year + 1)
+		
+		self.assertEqual(ProjectYearSetting.objects.get(project=self.manualProject, year=self.year + 1).nps_baseline, 12.3)
+		self.assertIsNone(ProjectYearSetting.objects.get(project=self.automaticProject, year=self.year + 1).nps_baseline)
+
+
+class HistoricalChartsQueryTests(TestCase):
+	'''
+	Detail page history charts load their snapshots and year settings once, however many quarters and years they show.
+	'''
+	def setUp(self):
+		createTestCategories()
+		user = createTestUser()
+		self.project = createTestProject('History project', responsesCount=1000, daysBack=800, user=user)
+		self.project.updateAllSnapshots()
+		
+		year = timezone.now().year
+		for settingYear in range(year - 3, year + 1):
+			ProjectYearSetting.objects.create(project=self.project, year=settingYear, created_by=user, updated_by=user, nps_target=10, nps_target_exceed=20)
+
+	def test_charts_query_count(self):
+		allProjectSnapshots = self.project.project_snapshot_project.all()
+		
+		with self.assertNumQueries(2):
+			chartsData = helpers.getHistoricalChartsData(allProjectSnapshots)
+		
+		self.assertGreater(len(chartsData['goal']['xaxis']), 4)
+		self.assertIn(10, chartsData['nps']['target'])
@@ -24,6 +24,7 @@ urlpatterns = [
 	# Admin only APIs:
 	url(r'^api/deleteprojectresponses/$', api_delete_project_responses, name='api_delete_project_responses'),
 	url(r'^api/deleteresponse/$', api_delete_response, name='api_delete_response'),
+	url(r'^api/recalculateallsnapshots/$', api_recalculate_all_snapshots, name='api_recalculate_all_snapshots'),
 	url(r'^api/recalculatesnapshot/$', api_recalculate_snapshot, name='api_recalculate_snapshot'),
 	url(r'^api/setresponsesgoal/$', api_set_responses_goal, name='api_set_responses_goal'),
 			
@@ -45,6 +46,7 @@ urlpatterns = [
 	url(r'^$', metrics_home, name='home'),
 	url(r'^projects/$', projects_home, name='projects_home'),
 	url(r'^projects/detail/$', projects_detail, name='projects_detail'),
+	url(r'^projects/timemachine/$', projects_time_machine, name='projects_time_machine'),
 	url(r'^projects/responses/vote/$', projects_vote_responses, name='projects_vote_responses'),
 	url(r'^projects/responses/feedback/$', projects_feedback_responses, name='projects_feedback_responses'),
 	url(r'^projects/responses/feedback/detail/(?P<uid>[\w-]+)/$', projects_feedback_responses_detail, name='projects_feedback_responses_detail'),
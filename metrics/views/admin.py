@@ -22,7 +22,7 @@ from metrics.models import *
 from research.models import *
 from info.models import *
 from ..forms import *
-from metrics.response_data_helpers import createCsvFromData, createCsvAndEmailFile, fetchNewUsabillaResponses
+from metrics.response_data_helpers import createCsvFromData, createCsvAndEmailFile, fetchNewUsabillaResponses, reclassifyScores
 import metrics.helpers as helpers
 import metrics.access_helpers as accessHelpers
 
@@ -162,6 +162,17 @@ def doCommonEditItemView(request, thisModel, id, nameField, viewTemplate=None, a
 	return response
 
 
+def reclassifyScoresIfSaved(request, response):
+	"""
+	For category/target admin views: if the item was saved (redirected to the list), 
+	  re-set stored categories and targets in the background.
+	"""
+	if request.method == 'POST' and response.status_code == 302:
+		helpers.runInBackground(reclassifyScores)
+	
+	return response
+
+
 def doCommonDeleteView(request, thisModel):
 	thisId = request.POST.get('id', None)
 	thisItem = get_object_or_404(thisModel, id=thisId)
@@ -877,7 +888,7 @@ def admin_npsscorecategory_list(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_npsscorecategory_add(request):
 	thisModel = NpsScoreCategory
-	return doCommonAddItemView(request, thisModel)
+	return reclassifyScoresIfSaved(request, doCommonAddItemView(request, thisModel))
 
 
 ##
@@ -886,7 +897,7 @@ def admin_npsscorecategory_add(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_npsscorecategory_edit(request, id):
 	thisModel = NpsScoreCategory
-	return doCommonEditItemView(request, thisModel, id, 'name')
+	return reclassifyScoresIfSaved(request, doCommonEditItemView(request, thisModel, id, 'name'))
 
 
 ##
@@ -905,7 +916,7 @@ def admin_goalcompletedcategory_list(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_goalcompletedcategory_add(request):
 	thisModel = GoalCompletedCategory
-	return doCommonAddItemView(request, thisModel)
+	return reclassifyScoresIfSaved(request, doCommonAddItemView(request, thisModel))
 
 
 ##
@@ -914,7 +925,7 @@ def admin_goalcompletedcategory_add(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_goalcompletedcategory_edit(request, id):
 	thisModel = GoalCompletedCategory
-	return doCommonEditItemView(request, thisModel, id, 'name')
+	return reclassifyScoresIfSaved(request, doCommonEditItemView(request, thisModel, id, 'name'))
 
 
 ##
@@ -961,7 +972,7 @@ def admin_umuxscorecategory_list(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_umuxscorecategory_add(request):
 	thisModel = UmuxScoreCategory
-	return doCommonAddItemView(request, thisModel)
+	return reclassifyScoresIfSaved(request, doCommonAddItemView(request, thisModel))
 
 
 ##
@@ -970,7 +981,7 @@ def admin_umuxscorecategory_add(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_umuxscorecategory_edit(request, id):
 	thisModel = UmuxScoreCategory
-	return doCommonEditItemView(request, thisModel, id, 'name')
+	return reclassifyScoresIfSaved(request, doCommonEditItemView(request, thisModel, id, 'name'))
 
 
 ##
@@ -1452,7 +1463,7 @@ def admin_target_list(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_target_add(request):
 	thisModel = Target
-	return doCommonAddItemView(request, thisModel)
+	return reclassifyScoresIfSaved(request, doCommonAddItemView(request, thisModel))
 
 
 ##
@@ -1461,7 +1472,7 @@ def admin_target_add(request):
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_target_edit(request, id):
 	thisModel = Target
-	return doCommonEditItemView(request, thisModel, id, 'nps_score', viewTemplate='metrics/admin_target_edit.html')
+	return reclassifyScoresIfSaved(request, doCommonEditItemView(request, thisModel, id, 'nps_score', viewTemplate='metrics/admin_target_edit.html'))
 
 
 ##
@@ -1469,7 +1480,7 @@ def admin_target_edit(request, id):
 ##
 @user_passes_test(accessHelpers.hasAdminAccess_decorator)
 def admin_target_delete(request):
-	return doCommonDeleteView(request, Target)
+	return reclassifyScoresIfSaved(request, doCommonDeleteView(request, Target))
 
 
 ##
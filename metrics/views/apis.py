@@ -8,6 +8,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import transaction
 from django.db.models import Count, Value
 from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
@@ -201,6 +202,7 @@ def api_set_responses_goal(request):
 			}, status=200)	
 		else:
 			VoteResponse.processGoalImportUpdateFile(attachment)
+			helpers.runInBackground(updateDirtySnapshots)
 			response = JsonResponse({
 				'message': 'Goals for your responses have been updated successfully.'
 			}, status=200)	
@@ -332,7 +334,7 @@ def api_survey_submit_raw_data(request):
 		# Push campaign ID/key into mapping so "convert response" can find and use it.
 		CAMPAIGNS_ID_NAME_MAP[requestJson['campaignId']] = requestJson['campaignKey']
 		
-		response = convertFeedbackResponseToData(requestJson['data'])
+		response = convertFeedbackResponseToData(requestJson['data'], getImportDimensionCache())
 		FeedbackResponse.objects.create(**response)
 	except Exception as ex:
 		print(f'Error: api_survey_submit_raw_data failed - {ex}')
@@ -359,10 +361,22 @@ def api_delete_response(request):
 		
 	try:
 		response = responseModelToUse.objects.get(id=request.POST.get('id'))
+		
+		# Vote responses feed snapshots, queue its periods for recalculation.
+		if responseModelToUse == VoteResponse:
+			SnapshotDirtyPeriod.markResponsesDirty([response])
+			responseDays = ProjectDailyRollup.getResponseDays([response])
+		
 		response.delete()
+		
+		if responseModelToUse == VoteResponse:
+			ProjectDailyRollup.refreshDays(responseDays)
 	except Exception as ex:
 		return JsonResponse({'results': {'message': f'{ex}'}}, status=400)
 	
+	if responseModelToUse == VoteResponse:
+		helpers.runInBackground(updateDirtySnapshots)
+	
 	return JsonResponse({'results': {'message': 'Success.'}}, status=200)
 	
 	
@@ -389,10 +403,23 @@ def api_delete_project_responses(request):
 		return JsonResponse({'results': {'message': f'{ex}'}}, status=400)
 	
 	try:
-		responseModelToUse.objects.filter(campaign__project=project).delete()
+		responses = responseModelToUse.objects.filter(campaign__project=project)
+		
+		# Vote responses feed snapshots, queue their periods for recalculation.
+		if responseModelToUse == VoteResponse:
+			SnapshotDirtyPeriod.markResponsesDirty(responses)
+			responseDays = ProjectDailyRollup.getResponseDays(responses)
+		
+		responses.delete()
+		
+		if responseModelToUse == VoteResponse:
+			ProjectDailyRollup.refreshDays(responseDays)
 	except Exception as ex:
 		return JsonResponse({'results': {'message': f'{ex}'}}, status=400)
 	
+	if responseModelToUse == VoteResponse:
+		helpers.runInBackground(updateDirtySnapshots)
+	
 	return JsonResponse({'results': {'message': 'Success.'}}, status=200)
 	
 	
@@ -409,11 +436,18 @@ def api_recalculate_snapshot(request):
 		reportPeriod = request.POST.get('reportperiod')
 		
 		try:
-			if 'last90' in reportPeriod:
-				project.updateLast90Snapshot()
-			elif 'q' in reportPeriod:
-				quarterYear = reportPeriod.split('q')
-				project.updateQuarterSnapshot(year=quarterYear[1], quarter=quarterYear[0])
+			# Lock so a queue drain or full recalculation of this project can't write in between.
+			with transaction.atomic():
+				project.lockSnapshots()
+				
+				# Rebuild the daily rollups the snapshot is calculated from too, in case they're out of sync.
+				if 'last90' in reportPeriod:
+					ProjectDailyRollup.refresh([project.id], startDay=helpers.getDaysAgo(181).date())
+					project.updateLast90Snapshot()
+				elif 'q' in reportPeriod:
+					quarterYear = reportPeriod.split('q')
+					ProjectDailyRollup.refreshPeriod(project.id, year=quarterYear[1], quarter=quarterYear[0])
+					project.updateQuarterSnapshot(year=quarterYear[1], quarter=quarterYear[0])
 		except Exception as ex:
 			return JsonResponse({'results': {'message': f'{ex}'}}, status=400)
 		
@@ -427,4 +461,27 @@ def api_recalculate_snapshot(request):
 	return JsonResponse({'results': {'message': 'Success.'}}, status=200)
 	
 
+##
+##	/metrics/api/recalculateallsnapshots/
+##
+@user_passes_test(accessHelpers.hasAdminAccess)
+def api_recalculate_all_snapshots(request):
+	'''
+	Admin only - Recalculate every snapshot for all active projects (or the given project IDs), in the background.
+	Runs serially on the background thread. The process pool is only for the recalculate_snapshots 
+	  management command, it shouldn't be forked from a web worker.
+	'''
+	if request.method != 'POST':
+		return HttpResponseNotAllowed(['POST'])
+	
+	try:
+		projectIds = [int(id) for id in request.POST.getlist('projects')] or None
+	except Exception as ex:
+		return JsonResponse({'results': {'message': f'{ex}'}}, status=400)
+	
+	helpers.runInBackground(recalculateAllSnapshots, kwargs={'projectIds': projectIds})
+	
+	return JsonResponse({'results': {'message': 'Started.'}}, status=200)
+	
+
 
@@ -75,8 +75,7 @@ def redirect_project_comments(request):
 def metrics_home(request):
 	'''
 	Get the specified domain, or one from session last used.
-	Current local speed avg: 135q in 181ms
-	getHistoricalNpsCatCountChartData is the bottleneck.
+	History charts are grouped queries, so the query count no longer grows with the number of quarters.
 	'''
 	selectedDomain = helpers.getFilterDomain(request)
 	
@@ -227,15 +226,19 @@ def domains_table(request):
 			'numProjects': 0
 		})
 	
+	# Core project counts per domain and NPS category in one grouped query.
+	domainCategoryCounts = {
+		(item['domain'], item['currently_reporting_snapshot__nps_score_category']): item['num'] 
+		for item in Project.objects.allActive().filter(core_project=True, currently_reporting_snapshot__nps_meaningful_data=True).order_by().values('domain', 'currently_reporting_snapshot__nps_score_category').annotate(num=Count('id', distinct=True))
+	}
+	
 	# For each domain
 	for domainSnapshot in domainSnapshots:
-		domainProjects = Project.objects.allActive().filter(domain=domainSnapshot.domain, core_project=True).select_related('currently_reporting_snapshot__nps_score_category')
-		
 		# For each NPS category:
 		# Add the count of projects in the category to the domain row and overall "total" row.
 		domainSnapshot.npsScoreCategories = []
 		for i, category in enumerate(npsScoreCategories, start=0):
-			num = domainProjects.filter(currently_reporting_snapshot__nps_score_category=category, currently_reporting_snapshot__nps_meaningful_data=True).values('id').distinct().count()
+			num = domainCategoryCounts.get((domainSnapshot.domain_id, category.id), 0)
 			
 			if num > 0:
 				totalNpsCategories[i]['numProjects'] += num
@@ -337,6 +340,75 @@ def projects_home(request):
 	return response
 
 
+##
+##	/metrics/projects/timemachine/?date=<YYYY-MM-DD>&startdate=<YYYY-MM-DD>&name=<report name>
+##
+def projects_time_machine(request):
+	'''
+	Organization wide time machine: tiles of every project's snapshot (using the project filters) as of the given date.
+	Reports are stored and reused until the responses in range change (TimeMachineReport). "refresh=y" forces recalculating.
+	'''
+	try:
+		endDate = datetime.strptime(request.GET.get('date'), '%Y-%m-%d')
+		startDate = datetime.strptime(request.GET.get('startdate'), '%Y-%m-%d') if request.GET.get('startdate', None) else None
+	except Exception as ex:
+		helpers.setPageMessage(request, 'error', 'The time machine needs a valid date.')
+		return redirect(reverse('metrics:projects_home'))
+	
+	tileFiltersData = helpers.createProjectTilesFiltersData(request)
+	tileFiltersData['domains'] = Domain.objects.exclude(project_domain__isnull=True).distinct().only('name')
+	tileFiltersData['npsCategories'] = NpsScoreCategory.objects.only('name')
+	tileFiltersData['umuxCategories'] = UmuxScoreCategory.objects.only('name')
+	tileFiltersData['goalCategories'] = GoalCompletedCategory.objects.only('name')
+	
+	projects = Project.getFilteredSet(tileFiltersData, None)
+	user = request.user if request.user.is_authenticated else None
+	
+	if request.GET.get('refresh', None) == 'y':
+		timeMachineReport = TimeMachineReport.generate(endDate, startDate, projects, request.GET.get('name', ''), user)
+	else:
+		timeMachineReport = TimeMachineReport.getOrGenerate(endDate, startDate, projects, request.GET.get('name', ''), user)
+	
+	# Category filters only show projects with a snapshot in one of the selected categories.
+	projectSnapshots = timeMachineReport.getSnapshots()
+	categoryFilters = [
+		('selectedNpsCats', 'nps_score_category_id'),
+		('selectedUmuxCats', 'umux_score_category_id'),
+		('selectedGoalCats', 'goal_completed_category_id'),
+	]
+	for filterName, fieldName in categoryFilters:
+		if tileFiltersData[filterName]:
+			projectSnapshots = [snapshot for snapshot in projectSnapshots if str(getattr(snapshot, fieldName)) in tileFiltersData[filterName]]
+	
+	if tileFiltersData['selectedNpsCats'] or tileFiltersData['selectedUmuxCats'] or tileFiltersData['selectedGoalCats']:
+		projectsWithoutSnapshot = None
+	else:
+		projectsWithoutSnapshot = projects.exclude(id__in=[snapshot.project_id for snapshot in projectSnapshots])
+	
+	messageStartDate = f" from <strong>{startDate.strftime('%b %d, %Y')}</strong>" if startDate else ''
+	
+	context = {
+		'totalProjectsCount': Project.objects.allActive().count(),
+		'resultsCount': len(projectSnapshots) + (projectsWithoutSnapshot.count() if projectsWithoutSnapshot else 0),
+		'projectSnapshots': projectSnapshots,
+		'projectsWithoutSnapshot': projectsWithoutSnapshot,
+		'timeMachineReport': timeMachineReport,
+		'customTimeMachineMessage': f"You are viewing the time machine{messageStartDate} to <strong>{endDate.strftime('%b %d, %Y')}</strong>. Report calculated {timezone.localtime(timeMachineReport.created_at).strftime('%b %d, %Y %I:%M %p')}.",
+		'tileFiltersData': tileFiltersData,
+		'thisYear': timezone.now().year,
+		'legendModalNpsScoreCategories': NpsScoreCategory.objects.all(),
+		'legendModalUmuxScoreCategories': UmuxScoreCategory.objects.all(),
+		'legendModalGoalCompletedCategories': GoalCompletedCategory.objects.all(),
+		'priorities': [1,2,3,4,5],
+		'projectKeywords': ProjectKeyword.objects.filter(project_keywords__isnull=False).distinct(),
+		'menunavItem': 'projects',
+	}
+	
+	response = render(request, 'metrics/projects_tiles.html', context)
+	helpers.clearPageMessage(request)
+	return response
+
+
 ##
 ##	/metrics/projects/detail/?<project>
 ##
@@ -418,6 +490,9 @@ def projects_detail(request):
 	feedbackResponses = project.getFeedbackResponses().exclude(comments='').order_by('-date')[:10]
 	isProjectEditor = accessHelpers.isProjectEditor(request.user, project)	
 	
+	histogramData = helpers.getHistogramData(projectSnapshotResponses, project, projectSnapshot)
+	historicalChartsData = helpers.getHistoricalChartsData(historyChartSnapshots)
+	
 	
 	context = {
 		'breadcrumbs': breadcrumbs,
@@ -430,15 +505,15 @@ def projects_detail(request):
 		'projectSnapshot': projectSnapshot,
 		'isProjectEditor': accessHelpers.isProjectEditor(request.user, project),
 		'isProjectAdmin': accessHelpers.isProjectAdmin(request.user, project),
-		'npsChartDataArr': helpers.getHistoricalNpsChartData(historyChartSnapshots),
-		'npsHistogramData': helpers.getNpsHistogramData(projectSnapshotResponses),
+		'npsChartDataArr': historicalChartsData['nps'],
+		'npsHistogramData': histogramData['nps'],
 		'npsScoreCategories': NpsScoreCategory.objects.order_by('-max_score_range').all(),
-		'umuxChartDataArr': helpers.getHistoricalUmuxChartData(historyChartSnapshots),
-		'umuxCapHistogramData': helpers.getUmuxCapHistogramData(projectSnapshotResponses),
-		'umuxEaseHistogramData': helpers.getUmuxEaseHistogramData(projectSnapshotResponses),
+		'umuxChartDataArr': historicalChartsData['umux'],
+		'umuxCapHistogramData': histogramData['umuxCap'],
+		'umuxEaseHistogramData': histogramData['umuxEase'],
 		'umuxScoreCategories': UmuxScoreCategory.objects.order_by('max_score_range').all(),
-		'goalCompletionChartDataArr': helpers.getHistoricalGoalCompletionChartData(historyChartSnapshots),
-		'goalHistogramData': helpers.getGoalHistogramData(projectSnapshotResponses),
+		'goalCompletionChartDataArr': historicalChartsData['goal'],
+		'goalHistogramData': histogramData['goal'],
 		'responsesPerDay': responsesPerDay,
 		'hasAnyData': hasAnyData,
 		'legendModalNpsScoreCategories': NpsScoreCategory.objects.all(),
@@ -685,6 +760,8 @@ def projects_feedback_responses_detail(request, uid):
 def response_counts(request):
 	'''
 	Show response counts for each campaign
+	Perf: 1 grouped query for all project/month cells, domain totals summed from it.
+	Add ?format=csv to download the same grid.
 	'''
 	monthNames = []
 	monthNums = list(range(1, timezone.now().month + 1))
@@ -697,40 +774,46 @@ def response_counts(request):
 	for mNum in monthNums:
 		monthNames.append(timezone.datetime(1900, mNum, 1).strftime('%B'))
 	
+	# All projects (incl. inactive) so domain totals still count every project in the domain.
+	monthCells = ProjectSnapshot.objects.filter(
+		date_period='month', 
+		date__year=year, 
+		date__month__in=monthNums).order_by().values('project_id', 'project__domain_id', 'date__month').annotate(
+			responseCount=Sum('meaningful_response_count')
+		)
+	
+	projectMonthCounts = {}
+	domainMonthCounts = {}
+	for cell in monthCells:
+		responseCount = cell['responseCount'] or 0
+		projectMonthCounts[(cell['project_id'], cell['date__month'])] = responseCount
+		domainKey = (cell['project__domain_id'], cell['date__month'])
+		domainMonthCounts[domainKey] = domainMonthCounts.get(domainKey, 0) + responseCount
+	
 	projects = Project.objects.allActive().order_by(Lower('name')).select_related('domain', 'domain__lead__profile')
 	for project in projects:
-		snapshots = ProjectSnapshot.objects.filter(
-			project=project, 
-			date_period='month', 
-			date__year=year, 
-			date__month__in=monthNums).order_by('date__month').only('date', 'meaningful_response_count')
-		
-		project.monthCounts = []
-		hasMonths = []
-		for snapshot in snapshots:
-			project.monthCounts.append(snapshot.meaningful_response_count)
-			hasMonths.append(snapshot.date.month)
-			
-		missingMonths = list(set(monthNums) - set(hasMonths))
-		missingMonths.sort()
-		for m in missingMonths:
-			project.monthCounts.insert(m-1, 0)
+		project.monthCounts = [projectMonthCounts.get((project.id, mNum), 0) for mNum in monthNums]
 	
 	domains = Domain.objects.all().order_by(Lower('name')).select_related('lead__profile')
 	for d in domains:
-		countBymonth = []
-		for mNum in monthNums:
-			respCount = d.project_domain.filter(
-				project_snapshot_project__date__year=year,
-				project_snapshot_project__date__month=mNum, 
-				project_snapshot_project__date_period='month').aggregate(
-					npsCount=Sum('project_snapshot_project__meaningful_response_count')
-				)['npsCount']
-			if respCount:
-				countBymonth.append(respCount)
-			else:
-				countBymonth.append(0)
-		d.monthCounts = countBymonth
+		d.monthCounts = [domainMonthCounts.get((d.id, mNum), 0) for mNum in monthNums]
+	
+	if request.GET.get('format', None) == 'csv':
+		rowsArr = [['Project', 'Domain', 'Lead'] + monthNames]
+		for d in domains:
+			rowsArr.append(['', d.name, d.lead.profile.full_name if d.lead else ''] + d.monthCounts)
+		for project in projects:
+			rowsArr.append([project.name, project.domain.name if project.domain else '', project.domain.lead.profile.full_name if project.domain and project.domain.lead else ''] + project.monthCounts)
+		
+		#Send CSV to browser.
+		response = HttpResponse(content_type='text/csv')
+		response['Content-Disposition'] = f'attachment;filename="Monthly response counts {year}.csv"'
+		response.write(u'\ufeff'.encode('utf8'))
+		
+		writer = csv.writer(response)
+		writer.writerows(rowsArr)
+		
+		return response
 		
 	context = {
 		'breadcrumbs': getBreadcrumbBase(),